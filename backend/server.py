@@ -4,7 +4,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import StreamingResponse, Response
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
@@ -15,13 +18,37 @@ from datetime import datetime, timedelta, timezone
 import bcrypt
 import jwt
 from bson import ObjectId
+import requests
+from requests.adapters import HTTPAdapter
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import openpyxl
+from PIL import Image, ImageOps
 from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 import io
+import tempfile
 import time
 import re
 import hashlib
-from collections import defaultdict, deque
+import asyncio
+from abc import ABC, abstractmethod
+import base64
+import json
+import random
+import functools
+import fcntl
+import struct
+import math
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import defaultdict, deque, OrderedDict
+from multiprocessing import shared_memory, resource_tracker
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -40,9 +67,39 @@ class SecurityConfig:
     RATE_LIMIT_REQUESTS = 100  # requests per window
     RATE_LIMIT_WINDOW = 900   # 15 minutes in seconds
     
+    # Budgets are per identity: the employee of a valid JWT, otherwise the IP.
+    # A request spends its route's cost from the first group whose path prefix
+    # matches; ordinary requests cost RATE_LIMIT_DEFAULT_COST.
+    RATE_LIMIT_DEFAULT_COST = 2
+    RATE_LIMIT_GROUPS = {
+        "auth": {"prefixes": ["/api/auth/login", "/api/auth/register"], "limit": 60, "window": 900},
+        "uploads": {"prefixes": ["/api/files/upload"], "limit": 1000, "window": 3600},
+        "admin": {"prefixes": ["/api/admin/"], "limit": 600, "window": 900},
+        "default": {"prefixes": ["/"], "limit": RATE_LIMIT_REQUESTS * RATE_LIMIT_DEFAULT_COST, "window": RATE_LIMIT_WINDOW},
+    }
+    RATE_LIMIT_ROUTE_COSTS = {
+        "/api/notifications/unread-count": 1,
+        "/api/notifications/stream": 1,
+        "/api/files/upload": 20,
+        "/api/admin/export/users": 50,
+    }
+    RATE_LIMIT_IDENTITY_CACHE_SIZE = 10000  # decoded JWTs kept so the check doesn't verify signatures
+    
+    # Where request counts live: "memory" (per worker), "shared" (all workers
+    # on this host, shared memory) or "mongo" (all hosts)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_SHM_NAME = os.getenv('RATE_LIMIT_SHM_NAME', 'mikel_rate_limit')
+    RATE_LIMIT_SHM_SLOTS = int(os.getenv('RATE_LIMIT_SHM_SLOTS', '65536'))  # 32 bytes each
+    RATE_LIMIT_SHM_LOCK_STRIPES = 64
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '200000'))  # hard cap for the memory backend
+    RATE_LIMIT_SWEEP_INTERVAL = 60  # seconds between idle-key sweeps
+    
     # Login Protection
     LOGIN_MAX_ATTEMPTS = 5
     LOGIN_LOCKOUT_TIME = 300  # 5 minutes
+    # Failed logins are kept in their own RATE_LIMIT_BACKEND instance
+    # ("login_attempts" collection / "<shm name>_login" segment)
+    LOGIN_PROTECTION_MAX_IDENTITIES = int(os.getenv('LOGIN_PROTECTION_MAX_IDENTITIES', '100000'))
     
     # Content Security
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024 * 1024  # 100GB
@@ -62,64 +119,803 @@ class SecurityConfig:
         r'exec\s*\(',                # Code injection
     ]
 
+# Performance Configuration
+class PerformanceConfig:
+    # Password Hashing (bcrypt runs in a dedicated process pool)
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASH_QUEUE_DEPTH', '64'))
+    
+    # Authenticated user cache (get_current_user)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '5000'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))  # seconds
+    
+    # Employee ID sequence (IDs reserved per worker in blocks)
+    EMPLOYEE_ID_BLOCK_SIZE = int(os.getenv('EMPLOYEE_ID_BLOCK_SIZE', '10'))
+    
+    # Feed pagination
+    POSTS_PAGE_SIZE = int(os.getenv('POSTS_PAGE_SIZE', '20'))
+    POSTS_PAGE_SIZE_MAX = int(os.getenv('POSTS_PAGE_SIZE_MAX', '100'))
+    
+    # Notification delivery for "all users" notifications:
+    # "broadcast" stores one document plus per-user read state,
+    # "fanout" writes one copy per employee in a background job
+    NOTIFICATION_DELIVERY = os.getenv('NOTIFICATION_DELIVERY', 'broadcast')
+    NOTIFICATION_LIST_LIMIT = 50
+    NOTIFICATION_UNREAD_RECOUNT_INTERVAL = int(os.getenv('NOTIFICATION_UNREAD_RECOUNT_INTERVAL', '3600'))  # seconds, 0 disables
+    NOTIFICATION_UNREAD_RECOUNT_BATCH_SIZE = 500
+    BROADCAST_SEQ_CACHE_TTL = 5  # seconds other workers may take to see a new broadcast in unread counts
+    
+    # Live notifications over Server-Sent Events
+    SSE_HEARTBEAT_INTERVAL = int(os.getenv('SSE_HEARTBEAT_INTERVAL', '25'))  # seconds; below common proxy idle timeouts
+    SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '32'))  # undelivered events per connection before it must resync
+    SSE_REPLAY_BUFFER = int(os.getenv('SSE_REPLAY_BUFFER', '1000'))  # recent events kept for Last-Event-ID resume
+    SSE_RETRY_MS = 5000  # client reconnect delay
+    
+    # Notification fan-out (runs as a background job)
+    NOTIFICATION_FANOUT_CHUNK_SIZE = int(os.getenv('NOTIFICATION_FANOUT_CHUNK_SIZE', '500'))
+    NOTIFICATION_JOB_HISTORY = 50  # finished jobs kept for the admin progress endpoint
+    BACKGROUND_SHUTDOWN_GRACE = 10  # seconds to let running jobs finish on shutdown
+    
+    # Web Push delivery
+    PUSH_CONCURRENCY = int(os.getenv('PUSH_CONCURRENCY', '32'))  # parallel requests and pooled connections
+    PUSH_BATCH_SIZE = int(os.getenv('PUSH_BATCH_SIZE', '500'))
+    PUSH_MAX_RETRIES = int(os.getenv('PUSH_MAX_RETRIES', '3'))
+    PUSH_RETRY_BACKOFF = float(os.getenv('PUSH_RETRY_BACKOFF', '0.5'))  # seconds, doubled per attempt
+    PUSH_RETRY_MAX_DELAY = 30.0
+    PUSH_TIMEOUT = float(os.getenv('PUSH_TIMEOUT', '10'))
+    PUSH_TTL = int(os.getenv('PUSH_TTL', '86400'))  # how long the push service keeps undelivered messages
+    
+    # File blob storage ("gridfs" or "local")
+    FILE_STORAGE_BACKEND = os.getenv('FILE_STORAGE_BACKEND', 'gridfs')
+    FILE_STORAGE_PATH = Path(os.getenv('FILE_STORAGE_PATH', str(ROOT_DIR / 'uploads')))
+    FILE_CHUNK_SIZE = int(os.getenv('FILE_CHUNK_SIZE', str(1024 * 1024)))
+    
+    # Cache-Control max-age per file category (public for /view, private for /download)
+    FILE_CACHE_CONTROL = {
+        "image": os.getenv('FILE_CACHE_CONTROL_IMAGE', 'max-age=86400'),
+        "video": os.getenv('FILE_CACHE_CONTROL_VIDEO', 'max-age=604800'),
+        "document": os.getenv('FILE_CACHE_CONTROL_DOCUMENT', 'max-age=3600'),
+    }
+    FILE_CACHE_CONTROL_DEFAULT = os.getenv('FILE_CACHE_CONTROL_DEFAULT', 'no-cache')
+    
+    # Image derivatives served via /files/{id}/view?size=... (longest edge in px)
+    IMAGE_DERIVATIVE_SIZES = {"thumb": 320, "medium": 1024}
+    IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', '2'))
+    IMAGE_DERIVATIVE_MAX_SOURCE_BYTES = int(os.getenv('IMAGE_DERIVATIVE_MAX_SOURCE_BYTES', str(50 * 1024 * 1024)))
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_JPEG_QUALITY = 85
+    
+    # Admin dashboard statistics cache
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30'))  # seconds before a background refresh
+    STATS_CACHE_MAX_STALE = float(os.getenv('STATS_CACHE_MAX_STALE', '300'))  # older than this is recomputed inline
+    
+    # Write-behind likes_count / comments_count updates
+    COUNTER_FLUSH_INTERVAL_MS = int(os.getenv('COUNTER_FLUSH_INTERVAL_MS', '500'))
+    COUNTER_FLUSH_MAX_OPS = int(os.getenv('COUNTER_FLUSH_MAX_OPS', '1000'))  # pending increments that force a flush
+    
+    # Counter reconciliation (recomputes likes_count / comments_count from likes / comments)
+    COUNTER_RECONCILE_INTERVAL = int(os.getenv('COUNTER_RECONCILE_INTERVAL', '900'))  # seconds, 0 disables the loop
+    COUNTER_RECONCILE_BATCH_SIZE = int(os.getenv('COUNTER_RECONCILE_BATCH_SIZE', '500'))
+    # Seconds a document must be untouched before it is reconciled; several flush
+    # intervals, so other workers' buffered increments have landed by then
+    COUNTER_RECONCILE_SETTLE = max(10, 20 * COUNTER_FLUSH_INTERVAL_MS / 1000)
+    COUNTER_RECONCILE_LEASE = 300  # seconds one worker owns a run before another may take over
+
 # Security Classes
-class RateLimiter:
+def sliding_window_hit(window_index: int, current: int, previous: int, now: float, window: int, limit: int,
+                       cost: int = 1):
+    """Sliding-window counter: one request of `cost` units against (window_index, current, previous).
+    
+    The previous fixed window's count is weighted by how much of it still
+    overlaps the sliding window. Returns the new state and 0 if allowed,
+    otherwise the seconds until the request would be allowed again (rejected
+    requests are not counted).
+    """
+    cost = min(cost, limit)
+    index = int(now // window)
+    if window_index != index:
+        previous = current if window_index == index - 1 else 0
+        current = 0
+    elapsed = now - index * window
+    if previous * (1 - elapsed / window) + current + cost <= limit:
+        return index, current + cost, previous, 0
+    if current + cost <= limit:
+        # Wait for the previous window's weight to decay enough
+        retry_after = window * (1 - (limit - current - cost) / previous) - elapsed
+    else:
+        retry_after = window - elapsed
+    return index, current, previous, max(retry_after, 0.001)
+
+class RateLimitBackend(ABC):
+    """Request counters behind RateLimiter.
+    
+    `hit` spends `cost` units of `key`'s budget and returns 0 when the request
+    is allowed, otherwise the number of seconds until the key may retry. All
+    backends use the sliding-window counter in sliding_window_hit.
+    `hit_or_block` turns the counter that spends its budget into a block in
+    the same atomic step: a plain expiry marked with window index BLOCKED.
+    Live blocks are never evicted to make room for other keys.
+    """
+    name = "base"
+    BLOCKED = -1
+    
     def __init__(self):
-        self.requests = defaultdict(deque)
-        self.blocked_ips = defaultdict(float)
+        self.allowed = 0
+        self.denied = 0
     
-    def is_allowed(self, ip: str) -> bool:
-        current_time = time.time()
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> float:
+        ...
+    
+    @abstractmethod
+    async def hit_or_block(self, key: str, limit: int, window: int, block_seconds: float) -> float:
+        """Spend one unit of `key`'s budget; the unit that spends it blocks `key` for block_seconds.
         
-        # Check if IP is currently blocked
-        if ip in self.blocked_ips and current_time < self.blocked_ips[ip]:
-            return False
+        Returns the seconds left on the block of `key`, 0 if it is not blocked.
+        """
+    
+    @abstractmethod
+    async def reset(self, key: str):
+        ...
+    
+    @abstractmethod
+    async def blocked_for(self, key: str) -> float:
+        """Seconds left on a block of `key`, 0 if there is none"""
+    
+    @abstractmethod
+    async def usage(self) -> dict:
+        """Live keys and how many of them are blocks"""
+    
+    def _count(self, retry_after: float) -> float:
+        if retry_after > 0:
+            self.denied += 1
+        else:
+            self.allowed += 1
+        return retry_after
+    
+    def stats(self) -> dict:
+        return {"backend": self.name, "allowed": self.allowed, "denied": self.denied}
+    
+    def start(self):
+        pass
+    
+    def close(self):
+        pass
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-worker counters; each uvicorn worker enforces its own limit.
+    
+    Each key costs four integers: window index, current and previous counts
+    and the time it becomes idle. Keys are also filed in expiry buckets of
+    `sweep_interval` seconds (counters and blocks separately), so the periodic
+    sweeper only visits buckets that are already idle. `max_keys` caps the
+    table: idle keys are swept first, then the counter that expires first is
+    evicted; if only live blocks are left the new key is rejected.
+    """
+    name = "memory"
+    
+    def __init__(self, max_keys: int, sweep_interval: int):
+        super().__init__()
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._entries = {}  # key -> [window_index, current, previous, idle_at]
+        self._buckets = {}  # ceil(idle_at / sweep_interval) -> counter keys
+        self._block_buckets = {}  # same, for blocks
+        self._sweeper = None
+        self.evictions = 0
+        self.rejected = 0
+        self.swept = 0
+    
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> float:
+        entry = self._entry(key)
+        if entry is None:
+            return self._count(0)
         
-        # Clean old requests
-        window_start = current_time - SecurityConfig.RATE_LIMIT_WINDOW
-        while self.requests[ip] and self.requests[ip][0] < window_start:
-            self.requests[ip].popleft()
+        index, current, previous, retry_after = sliding_window_hit(entry[0], entry[1], entry[2], time.time(), window, limit, cost)
+        # Nothing of the state is left once two windows have passed
+        self._store(key, entry, index, current, previous, (index + 2) * window)
+        return self._count(retry_after)
+    
+    async def hit_or_block(self, key: str, limit: int, window: int, block_seconds: float) -> float:
+        now = time.time()
+        entry = self._entry(key)
+        if entry is None:
+            return 0
+        if entry[0] == self.BLOCKED and entry[3] > now:
+            return entry[3] - now
         
-        # Check rate limit
-        if len(self.requests[ip]) >= SecurityConfig.RATE_LIMIT_REQUESTS:
-            # Block IP
-            self.blocked_ips[ip] = current_time + SecurityConfig.RATE_LIMIT_WINDOW
+        index, current, previous, _ = sliding_window_hit(entry[0], entry[1], entry[2], now, window, limit)
+        if sliding_window_hit(index, current, previous, now, window, limit)[3] > 0:
+            self._store(key, entry, self.BLOCKED, 0, 0, now + block_seconds)
+            return block_seconds
+        self._store(key, entry, index, current, previous, (index + 2) * window)
+        return 0
+    
+    async def reset(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unfile(key, entry)
+    
+    async def blocked_for(self, key: str) -> float:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != self.BLOCKED:
+            return 0
+        return max(0, entry[3] - time.time())
+    
+    async def usage(self) -> dict:
+        now = time.time()
+        tracked = blocked = 0
+        for entry in self._entries.values():
+            if entry[3] > now:
+                tracked += 1
+                if entry[0] == self.BLOCKED:
+                    blocked += 1
+        return {"tracked": tracked, "blocked": blocked}
+    
+    def _entry(self, key: str):
+        """Entry of `key`, created if there is room; None if the key is rejected"""
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_keys and not self._make_room():
+                return None
+            entry = self._entries[key] = [0, 0, 0, 0]
+        return entry
+    
+    def _store(self, key: str, entry: list, index: int, current: int, previous: int, idle_at: float):
+        if idle_at != entry[3] or (index == self.BLOCKED) != (entry[0] == self.BLOCKED):
+            if entry[3]:
+                self._unfile(key, entry)
+            buckets = self._block_buckets if index == self.BLOCKED else self._buckets
+            buckets.setdefault(self._bucket(idle_at), set()).add(key)
+        entry[0], entry[1], entry[2], entry[3] = index, current, previous, idle_at
+    
+    def _bucket(self, idle_at: float) -> int:
+        return math.ceil(idle_at / self.sweep_interval)
+    
+    def _unfile(self, key: str, entry: list):
+        buckets = self._block_buckets if entry[0] == self.BLOCKED else self._buckets
+        bucket = self._bucket(entry[3])
+        keys = buckets.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del buckets[bucket]
+    
+    def _make_room(self) -> bool:
+        if self.sweep():
+            return True
+        if not self._buckets:
+            # Only live blocks are left; evicting one would lift a lockout
+            self.rejected += 1
             return False
-        
-        # Add current request
-        self.requests[ip].append(current_time)
+        bucket = min(self._buckets)
+        keys = self._buckets[bucket]
+        del self._entries[keys.pop()]
+        if not keys:
+            del self._buckets[bucket]
+        self.evictions += 1
         return True
+    
+    def sweep(self) -> int:
+        # A bucket is idle once its upper bound has passed
+        last_idle = math.floor(time.time() / self.sweep_interval)
+        removed = 0
+        for buckets in (self._buckets, self._block_buckets):
+            for bucket in [bucket for bucket in buckets if bucket <= last_idle]:
+                for key in buckets.pop(bucket):
+                    del self._entries[key]
+                    removed += 1
+        self.swept += removed
+        return removed
+    
+    async def _run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+    
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._run_sweeper())
+    
+    def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+    
+    def stats(self) -> dict:
+        return {**super().stats(), "tracked_keys": len(self._entries), "max_keys": self.max_keys,
+                "expiry_buckets": len(self._buckets) + len(self._block_buckets), "evictions": self.evictions,
+                "rejected": self.rejected, "swept": self.swept}
 
-class LoginProtection:
-    def __init__(self):
-        self.failed_attempts = defaultdict(list)
-        self.blocked_users = defaultdict(float)
+class SharedMemoryRateLimitBackend(RateLimitBackend):
+    """Sliding-window counters in a shared-memory hash table used by every worker on the host.
+    
+    The segment holds a 16 byte header (magic, slot count) and fixed 32 byte
+    slots: key hash, window index, expiry, current and previous counts. The
+    layout version is part of the segment name. A key may only live in the
+    PROBE slots of its home region, so one fcntl byte-range lock per region
+    (striped over a lock file) serializes every writer that can touch a slot.
+    When a region is full, the counter that expires first is reused; live
+    blocks are never reused, and a new key is rejected when a region holds
+    nothing else. The segment outlives the workers on purpose and is reused
+    on restart.
+    """
+    name = "shared"
+    MAGIC = 0x4D494B454C524C32  # "MIKELRL2"
+    HEADER = struct.Struct("<QQ")
+    SLOT = struct.Struct("<QqdII")  # key hash, window index, expires_at, current, previous
+    PROBE = 8
+    
+    def __init__(self, segment_name: str, slots: int, lock_stripes: int):
+        super().__init__()
+        segment_name = f"{segment_name}_v2"
+        self.segment_name = segment_name
+        slots = max(self.PROBE, slots - slots % self.PROBE)
+        size = self.HEADER.size + slots * self.SLOT.size
+        try:
+            self._shm = shared_memory.SharedMemory(name=segment_name, create=True, size=size)
+            self.HEADER.pack_into(self._shm.buf, 0, self.MAGIC, slots)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=segment_name)
+            slots = self._wait_for_header()
+        # Workers come and go; the resource tracker must not unlink the segment when one exits
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+        
+        self.slots = slots
+        self.regions = slots // self.PROBE
+        self.lock_stripes = max(1, lock_stripes)
+        self._lock_fd = os.open(os.path.join(tempfile.gettempdir(), f"{segment_name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        self.evictions = 0
+        self.rejected = 0
+    
+    def _wait_for_header(self) -> int:
+        # The creating worker may not have written the header yet
+        for _ in range(100):
+            magic, slots = self.HEADER.unpack_from(self._shm.buf, 0)
+            if magic == self.MAGIC:
+                return slots
+            time.sleep(0.01)
+        raise RuntimeError(f"Shared memory segment {self.segment_name} has no rate limit header")
     
-    def is_blocked(self, email: str) -> bool:
-        current_time = time.time()
-        return email in self.blocked_users and current_time < self.blocked_users[email]
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Stable across processes, unlike hash(); 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+    
+    def _offset(self, index: int) -> int:
+        return self.HEADER.size + index * self.SLOT.size
+    
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> float:
+        key_hash = self._hash(key)
+        region = key_hash % self.regions
+        stripe = region % self.lock_stripes
+        now = time.time()
+        
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+        try:
+            slot, (window_index, _, current, previous) = self._find_slot(region, key_hash, now)
+            if slot is None:
+                return self._count(0)
+            window_index, current, previous, retry_after = sliding_window_hit(
+                window_index, current, previous, now, window, limit, cost
+            )
+            self.SLOT.pack_into(self._shm.buf, self._offset(slot), key_hash, window_index,
+                                (window_index + 2) * window, current, previous)
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+        
+        return self._count(retry_after)
     
-    def record_failed_attempt(self, email: str):
-        current_time = time.time()
-        # Clean old attempts (older than lockout time)
-        self.failed_attempts[email] = [
-            attempt for attempt in self.failed_attempts[email]
-            if current_time - attempt < SecurityConfig.LOGIN_LOCKOUT_TIME
-        ]
+    async def hit_or_block(self, key: str, limit: int, window: int, block_seconds: float) -> float:
+        key_hash = self._hash(key)
+        region = key_hash % self.regions
+        stripe = region % self.lock_stripes
+        now = time.time()
+        
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+        try:
+            slot, (window_index, expires_at, current, previous) = self._find_slot(region, key_hash, now)
+            if slot is None:
+                return 0
+            if window_index == self.BLOCKED and expires_at > now:
+                return expires_at - now
+            
+            window_index, current, previous, _ = sliding_window_hit(window_index, current, previous, now, window, limit)
+            if sliding_window_hit(window_index, current, previous, now, window, limit)[3] > 0:
+                self.SLOT.pack_into(self._shm.buf, self._offset(slot), key_hash, self.BLOCKED, now + block_seconds, 0, 0)
+                return block_seconds
+            self.SLOT.pack_into(self._shm.buf, self._offset(slot), key_hash, window_index,
+                                (window_index + 2) * window, current, previous)
+            return 0
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+    
+    def _locked(self, key: str, action):
+        """action(slot or None, key_hash) under the lock of key's region; slot is where key lives"""
+        key_hash = self._hash(key)
+        region = key_hash % self.regions
+        stripe = region % self.lock_stripes
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+        try:
+            first = region * self.PROBE
+            for index in range(first, first + self.PROBE):
+                if self.SLOT.unpack_from(self._shm.buf, self._offset(index))[0] == key_hash:
+                    return action(index)
+            return action(None)
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+    
+    async def reset(self, key: str):
+        def clear(slot):
+            if slot is not None:
+                self.SLOT.pack_into(self._shm.buf, self._offset(slot), 0, 0, 0, 0, 0)
+        self._locked(key, clear)
+    
+    async def blocked_for(self, key: str) -> float:
+        now = time.time()
+        
+        def remaining(slot):
+            if slot is None:
+                return 0
+            _, window_index, expires_at, _, _ = self.SLOT.unpack_from(self._shm.buf, self._offset(slot))
+            return max(0, expires_at - now) if window_index == self.BLOCKED else 0
+        return self._locked(key, remaining)
+    
+    async def usage(self) -> dict:
+        # Unlocked read; a slot written meanwhile is counted with either state
+        now = time.time()
+        tracked = blocked = 0
+        for index in range(self.slots):
+            slot_hash, window_index, expires_at, _, _ = self.SLOT.unpack_from(self._shm.buf, self._offset(index))
+            if slot_hash and expires_at > now:
+                tracked += 1
+                if window_index == self.BLOCKED:
+                    blocked += 1
+        return {"tracked": tracked, "blocked": blocked}
+    
+    def _find_slot(self, region: int, key_hash: int, now: float):
+        """Slot index for key_hash in its region and its (window_index, expires_at, current, previous).
         
-        # Add current failed attempt
-        self.failed_attempts[email].append(current_time)
+        The slot index is None when the region only holds live blocks.
+        """
+        first = region * self.PROBE
+        reusable = None
+        oldest = None
+        for index in range(first, first + self.PROBE):
+            slot_hash, window_index, expires_at, current, previous = self.SLOT.unpack_from(self._shm.buf, self._offset(index))
+            if slot_hash == key_hash:
+                return index, (window_index, expires_at, current, previous)
+            if reusable is None and (slot_hash == 0 or expires_at <= now):
+                reusable = index
+            if window_index != self.BLOCKED and (oldest is None or expires_at < oldest[1]):
+                oldest = (index, expires_at)
+        if reusable is None:
+            if oldest is None:
+                # Evicting a live block would lift a lockout
+                self.rejected += 1
+                return None, (0, 0, 0, 0)
+            self.evictions += 1
+            reusable = oldest[0]
+        return reusable, (0, 0, 0, 0)
+    
+    def stats(self) -> dict:
+        now = time.time()
+        occupied = 0
+        for index in range(self.slots):
+            slot_hash, _, expires_at, _, _ = self.SLOT.unpack_from(self._shm.buf, self._offset(index))
+            if slot_hash and expires_at > now:
+                occupied += 1
+        return {**super().stats(), "slots": self.slots, "occupied_slots": occupied, "evictions": self.evictions,
+                "rejected": self.rejected}
+    
+    def close(self):
+        os.close(self._lock_fd)
+        self._shm.close()
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """Sliding-window counters in a Mongo collection (rate_limits), shared by every host.
+    
+    One pipeline update per request rolls the windows and counts the request
+    if it fits, atomically; a TTL index removes idle keys. Fails open if
+    Mongo errors.
+    """
+    name = "mongo"
+    
+    def __init__(self, collection: str = "rate_limits"):
+        super().__init__()
+        self.collection = collection
+        self.errors = 0
+    
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> float:
+        cost = min(cost, limit)
+        now = time.time()
+        index = int(now // window)
+        overlap = 1 - (now - index * window) / window  # weight of the previous window
+        try:
+            # Same arithmetic as sliding_window_hit, evaluated by the server
+            doc = await db[self.collection].find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {
+                        "previous": {"$switch": {"branches": [
+                            {"case": {"$eq": ["$window", index]}, "then": "$previous"},
+                            {"case": {"$eq": ["$window", index - 1]}, "then": "$current"}
+                        ], "default": 0}},
+                        "current": {"$cond": [{"$eq": ["$window", index]}, "$current", 0]},
+                        "window": index
+                    }},
+                    {"$set": {"allowed": {"$lte": [
+                        {"$add": [{"$multiply": ["$previous", overlap]}, "$current", cost]}, limit
+                    ]}}},
+                    {"$set": {
+                        "current": {"$cond": ["$allowed", {"$add": ["$current", cost]}, "$current"]},
+                        "expires_at": datetime.utcfromtimestamp((index + 2) * window)
+                    }}
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ RATE LIMIT BACKEND ERROR: {e}")
+            return self._count(0)
         
-        # Check if should block
-        if len(self.failed_attempts[email]) >= SecurityConfig.LOGIN_MAX_ATTEMPTS:
-            self.blocked_users[email] = current_time + SecurityConfig.LOGIN_LOCKOUT_TIME
+        if doc["allowed"]:
+            return self._count(0)
+        return self._count(sliding_window_hit(index, doc["current"], doc["previous"], now, window, limit, cost)[3])
+    
+    async def hit_or_block(self, key: str, limit: int, window: int, block_seconds: float) -> float:
+        now = time.time()
+        index = int(now // window)
+        overlap = 1 - (now - index * window) / window  # weight of the previous window
+        now_at = datetime.utcfromtimestamp(now)
+        active = "$active_block"
+        try:
+            # One update: roll the windows, count the failure and turn a spent budget into a block
+            doc = await db[self.collection].find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"active_block": {"$and": [
+                        {"$eq": ["$window", self.BLOCKED]}, {"$gt": ["$expires_at", now_at]}
+                    ]}}},
+                    {"$set": {
+                        "previous": {"$cond": [active, 0, {"$switch": {"branches": [
+                            {"case": {"$eq": ["$window", index]}, "then": "$previous"},
+                            {"case": {"$eq": ["$window", index - 1]}, "then": "$current"}
+                        ], "default": 0}}]},
+                        "current": {"$cond": [active, 0, {"$add": [
+                            {"$cond": [{"$eq": ["$window", index]}, "$current", 0]}, 1
+                        ]}]},
+                        "window": {"$cond": [active, self.BLOCKED, index]}
+                    }},
+                    {"$set": {"spent": {"$and": [{"$not": [active]}, {"$gt": [
+                        {"$add": [{"$multiply": ["$previous", overlap]}, "$current", 1]}, limit
+                    ]}]}}},
+                    {"$set": {
+                        "window": {"$cond": ["$spent", self.BLOCKED, "$window"]},
+                        "current": {"$cond": ["$spent", 0, "$current"]},
+                        "previous": {"$cond": ["$spent", 0, "$previous"]},
+                        "expires_at": {"$switch": {"branches": [
+                            {"case": active, "then": "$expires_at"},
+                            {"case": "$spent", "then": datetime.utcfromtimestamp(now + block_seconds)}
+                        ], "default": datetime.utcfromtimestamp((index + 2) * window)}}
+                    }},
+                    {"$unset": ["active_block", "spent"]}
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ RATE LIMIT BACKEND ERROR: {e}")
+            return 0
+        if doc["window"] != self.BLOCKED:
+            return 0
+        return max(0, (doc["expires_at"] - now_at).total_seconds())
+    
+    async def reset(self, key: str):
+        try:
+            await db[self.collection].delete_one({"_id": key})
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ RATE LIMIT BACKEND ERROR: {e}")
+    
+    async def blocked_for(self, key: str) -> float:
+        try:
+            doc = await db[self.collection].find_one({"_id": key, "window": self.BLOCKED})
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ RATE LIMIT BACKEND ERROR: {e}")
+            return 0
+        if doc is None:
+            return 0
+        # The TTL monitor may not have removed an expired block yet
+        return max(0, (doc["expires_at"] - datetime.utcnow()).total_seconds())
+    
+    async def usage(self) -> dict:
+        try:
+            result = await db[self.collection].aggregate([
+                {"$match": {"expires_at": {"$gt": datetime.utcnow()}}},
+                {"$group": {
+                    "_id": None,
+                    "tracked": {"$sum": 1},
+                    "blocked": {"$sum": {"$cond": [{"$eq": ["$window", self.BLOCKED]}, 1, 0]}}
+                }}
+            ]).to_list(1)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ RATE LIMIT BACKEND ERROR: {e}")
+            return {"tracked": 0, "blocked": 0}
+        if not result:
+            return {"tracked": 0, "blocked": 0}
+        return {"tracked": result[0]["tracked"], "blocked": result[0]["blocked"]}
+    
+    def stats(self) -> dict:
+        return {**super().stats(), "collection": self.collection, "errors": self.errors}
+
+def create_rate_limit_backend(name: str) -> RateLimitBackend:
+    if name == "shared":
+        return SharedMemoryRateLimitBackend(
+            SecurityConfig.RATE_LIMIT_SHM_NAME,
+            SecurityConfig.RATE_LIMIT_SHM_SLOTS,
+            SecurityConfig.RATE_LIMIT_SHM_LOCK_STRIPES
+        )
+    if name == "mongo":
+        return MongoRateLimitBackend()
+    return MemoryRateLimitBackend(SecurityConfig.RATE_LIMIT_MAX_KEYS, SecurityConfig.RATE_LIMIT_SWEEP_INTERVAL)
+
+def create_login_protection_backend(name: str) -> RateLimitBackend:
+    # Separate from the request counters so a request flood can't evict lockouts
+    if name == "shared":
+        return SharedMemoryRateLimitBackend(
+            f"{SecurityConfig.RATE_LIMIT_SHM_NAME}_login",
+            SecurityConfig.LOGIN_PROTECTION_MAX_IDENTITIES,
+            SecurityConfig.RATE_LIMIT_SHM_LOCK_STRIPES
+        )
+    if name == "mongo":
+        return MongoRateLimitBackend("login_attempts")
+    return MemoryRateLimitBackend(SecurityConfig.LOGIN_PROTECTION_MAX_IDENTITIES, SecurityConfig.RATE_LIMIT_SWEEP_INTERVAL)
+
+class RateLimitPolicy:
+    """Budget of one route group: `limit` cost units per `window` seconds per identity"""
+    def __init__(self, name: str, prefixes: list, limit: int, window: int):
+        self.name = name
+        self.prefixes = tuple(prefixes)
+        self.limit = limit
+        self.window = window
+        self.denied = 0
+
+class RateLimiter:
+    """Picks the route group, cost and identity of a request and charges the backend.
+    
+    Employees behind one store NAT share an IP, so requests with a valid JWT
+    are counted per employee; only anonymous requests fall back to the IP.
+    Verified tokens are remembered in a small LRU until they expire, so a
+    check is a dict lookup plus a prefix scan rather than a signature check.
+    Tokens that fail verification are not cached, so junk tokens can't push
+    employees out of the LRU; those requests are counted per IP.
+    """
+    # The only route that accepts ?token= for authentication (EventSource can't send headers)
+    QUERY_TOKEN_PATHS = ("/api/notifications/stream",)
+
+    def __init__(self, backend: RateLimitBackend, groups: dict, route_costs: dict, default_cost: int, identity_cache_size: int):
+        self.backend = backend
+        self.policies = [RateLimitPolicy(name, **spec) for name, spec in groups.items()]
+        # Longest prefix first, so specific routes win over their parents
+        self.route_costs = sorted(route_costs.items(), key=lambda item: -len(item[0]))
+        self.default_cost = default_cost
+        self.identity_cache_size = identity_cache_size
+        self._identities = OrderedDict()  # token -> (identity, expires_at)
+        self.identity_hits = 0
+        self.identity_misses = 0
+        self.identity_failures = 0
+    
+    def resolve(self, path: str):
+        """(policy, cost) for a request path"""
+        cost = self.default_cost
+        for prefix, route_cost in self.route_costs:
+            if path.startswith(prefix):
+                cost = route_cost
+                break
+        for policy in self.policies:
+            if path.startswith(policy.prefixes):
+                return policy, cost
+        return self.policies[-1], cost
+    
+    def identify(self, token: Optional[str], client_ip: str) -> str:
+        if token:
+            now = time.time()
+            cached = self._identities.get(token)
+            if cached is not None and cached[1] > now:
+                self.identity_hits += 1
+                self._identities.move_to_end(token)
+                return cached[0]
+            
+            self.identity_misses += 1
+            identity, expires_at = self._verify(token, now)
+            if identity is not None:
+                self._identities[token] = (identity, expires_at)
+                if len(self._identities) > self.identity_cache_size:
+                    self._identities.popitem(last=False)
+                return identity
+            self.identity_failures += 1
+        return f"ip:{client_ip}"
+    
+    @staticmethod
+    def _verify(token: str, now: float):
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.PyJWTError:
+            return None, now
+        expires_at = payload.get("exp", now + 60)
+        if payload.get("employee_id"):
+            return f"emp:{payload['employee_id']}", expires_at
+        if payload.get("sub"):
+            return f"user:{payload['sub']}", expires_at
+        return None, expires_at
+    
+    async def check(self, request: Request, client_ip: str):
+        """(policy, seconds until retry) - 0 seconds if the request may proceed"""
+        policy, cost = self.resolve(request.url.path)
+        authorization = request.headers.get("authorization", "")
+        token = None
+        if authorization[:7].lower() == "bearer ":
+            token = authorization[7:]
+        elif request.url.path in self.QUERY_TOKEN_PATHS:
+            token = request.query_params.get("token")
+        identity = self.identify(token, client_ip)
+        retry_after = await self.backend.hit(f"{policy.name}:{identity}", policy.limit, policy.window, cost)
+        if retry_after:
+            policy.denied += 1
+        return policy, retry_after
+    
+    def stats(self) -> dict:
+        return {
+            **self.backend.stats(),
+            "denied_by_group": {policy.name: policy.denied for policy in self.policies},
+            "identity_cache": {"size": len(self._identities), "hits": self.identity_hits, "misses": self.identity_misses,
+                               "failures": self.identity_failures}
+        }
+
+class LoginProtection:
+    """Failed logins per email, kept in a rate limit backend.
+    
+    Each failure spends one unit of a `max_attempts` budget per `lockout_time`
+    sliding window. The failure that spends the budget turns the counter into
+    a block for the full `lockout_time` in the same atomic backend step, and
+    the attempts start over afterwards. The backend bounds and expires the
+    state without ever evicting a live block, so a credential stuffing run
+    with random emails can neither grow it without limit nor lift a lockout;
+    the shared/mongo backends make a lockout hold on every worker.
+    """
+    def __init__(self, backend: RateLimitBackend, max_attempts: int, lockout_time: int):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.lockout_time = lockout_time
     
-    def record_success(self, email: str):
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"login:{email}"
+    
+    async def is_blocked(self, email: str) -> bool:
+        return await self.backend.blocked_for(self._key(email)) > 0
+    
+    async def record_failed_attempt(self, email: str):
+        await self.backend.hit_or_block(self._key(email), self.max_attempts, self.lockout_time, self.lockout_time)
+    
+    async def record_success(self, email: str):
         # Clear failed attempts on successful login
-        if email in self.failed_attempts:
-            del self.failed_attempts[email]
-        if email in self.blocked_users:
-            del self.blocked_users[email]
+        await self.backend.reset(self._key(email))
+    
+    async def stats(self) -> dict:
+        usage = await self.backend.usage()
+        return {
+            **self.backend.stats(),
+            "tracked_identities": usage["tracked"],
+            "blocked_identities": usage["blocked"],
+            "max_attempts": self.max_attempts,
+            "lockout_time": self.lockout_time
+        }
 
 class InputValidator:
     @staticmethod
@@ -147,8 +943,18 @@ class InputValidator:
         return len(content.encode('utf-8')) <= SecurityConfig.MAX_CONTENT_LENGTH
 
 # Initialize security components
-rate_limiter = RateLimiter()
-login_protection = LoginProtection()
+rate_limiter = RateLimiter(
+    create_rate_limit_backend(SecurityConfig.RATE_LIMIT_BACKEND),
+    groups=SecurityConfig.RATE_LIMIT_GROUPS,
+    route_costs=SecurityConfig.RATE_LIMIT_ROUTE_COSTS,
+    default_cost=SecurityConfig.RATE_LIMIT_DEFAULT_COST,
+    identity_cache_size=SecurityConfig.RATE_LIMIT_IDENTITY_CACHE_SIZE
+)
+login_protection = LoginProtection(
+    create_login_protection_backend(SecurityConfig.RATE_LIMIT_BACKEND),
+    max_attempts=SecurityConfig.LOGIN_MAX_ATTEMPTS,
+    lockout_time=SecurityConfig.LOGIN_LOCKOUT_TIME
+)
 input_validator = InputValidator()
 
 # JWT Configuration
@@ -156,6 +962,10 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_DELTA = timedelta(days=7)
 
+# Web Push (VAPID) - private key as base64url raw P-256 scalar or PEM
+VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY')
+VAPID_SUBJECT = os.environ.get('VAPID_SUBJECT', 'mailto:admin@mikelcoffee.com')
+
 # Create the main app without a prefix
 app = FastAPI(title="Mikel Coffee Employee Registration API")
 
@@ -169,15 +979,18 @@ async def security_middleware(request: Request, call_next):
         client_ip = request.state.forwarded_for.split(',')[0].strip()
     
     # Rate limiting check
-    if not rate_limiter.is_allowed(client_ip):
+    limit_group, retry_after = await rate_limiter.check(request, client_ip)
+    if retry_after:
         from fastapi.responses import JSONResponse
         return JSONResponse(
             status_code=429,
             content={
                 "error": "Rate limit exceeded",
                 "message": "Too many requests. Please try again later.",
-                "retry_after": SecurityConfig.RATE_LIMIT_WINDOW
-            }
+                "retry_after": math.ceil(retry_after),
+                "limit_group": limit_group.name
+            },
+            headers={"Retry-After": str(math.ceil(retry_after))}
         )
     
     # Content length check
@@ -224,6 +1037,7 @@ api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Position Constants
 POSITIONS = [
@@ -357,6 +1171,26 @@ class Post(BaseModel):
             ObjectId: str
         }
 
+class PostPage(BaseModel):
+    posts: List[Post]
+    next_cursor: Optional[str] = None  # None on the last page
+
+class FeedAuthor(BaseModel):
+    employee_id: str
+    name: str
+    surname: str
+    position: str
+    store: str
+    profile_image_url: Optional[str] = None
+
+class FeedPost(Post):
+    author: Optional[FeedAuthor] = None  # None when the author account was deleted
+    liked_by_me: bool = False
+
+class FeedPage(BaseModel):
+    posts: List[FeedPost]
+    next_cursor: Optional[str] = None
+
 class PostCreate(BaseModel):
     content: str
     image_url: Optional[str] = None
@@ -407,12 +1241,591 @@ class ProfileUpdate(BaseModel):
     profile_image_url: Optional[str] = None
     bio: Optional[str] = None
 
+# Performance Classes
+class LatencyStats:
+    """Running count / average / max of a latency series (seconds in, ms out)"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+def _bcrypt_hash(password: bytes):
+    # Runs inside a worker process
+    started_at = time.time()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt())
+    return hashed, started_at, time.time()
+
+def _bcrypt_check(password: bytes, hashed: bytes):
+    # Runs inside a worker process
+    started_at = time.time()
+    matches = bcrypt.checkpw(password, hashed)
+    return matches, started_at, time.time()
+
+class PasswordHasher:
+    """bcrypt'i event loop dışında, sınırlı bir process pool'da çalıştırır"""
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = None
+        self._pending = 0
+        self.rejected = 0
+        self.queue_wait = LatencyStats()
+        self.hash_latency = LatencyStats()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+    
+    async def run(self, func, *args):
+        # Reject instead of queueing without bound during a login storm
+        if self._pending >= self.workers + self.queue_depth:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy. Please try again shortly.",
+                headers={"Retry-After": "1"}
+            )
+        
+        self._pending += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self._executor = None
+            raise
+        finally:
+            self._pending -= 1
+        
+        self.queue_wait.record(max(0.0, started_at - submitted_at))
+        self.hash_latency.record(finished_at - started_at)
+        return result
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.snapshot(),
+            "hash_latency": self.hash_latency.snapshot()
+        }
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(
+    workers=PerformanceConfig.PASSWORD_HASH_WORKERS,
+    queue_depth=PerformanceConfig.PASSWORD_HASH_QUEUE_DEPTH
+)
+
+class UserCache:
+    """LRU + TTL cache of User models keyed by the users._id string.
+    
+    Entries are invalidated explicitly by the routes that modify or delete a
+    user; the TTL bounds staleness for changes made by other workers.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, User)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, user = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return user
+    
+    def set(self, user_id: str, user):
+        if self.max_size <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, user_id):
+        if self._entries.pop(str(user_id), None) is not None:
+            self.invalidations += 1
+    
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+user_cache = UserCache(
+    max_size=PerformanceConfig.USER_CACHE_SIZE,
+    ttl=PerformanceConfig.USER_CACHE_TTL
+)
+
+class CachedComputation:
+    """Caches the result of an async computation (stale-while-revalidate).
+    
+    Within `ttl` the cached value is returned as is. Between `ttl` and
+    `max_stale` it is still returned while one background refresh runs;
+    beyond `max_stale` (or when empty) callers wait for a fresh value.
+    """
+    def __init__(self, name: str, compute, ttl: float, max_stale: float):
+        self.name = name
+        self._compute = compute
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._value = None
+        self._computed_at = None
+        self._refreshing = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+        self.compute_time = LatencyStats()
+    
+    async def get(self):
+        age = time.monotonic() - self._computed_at if self._computed_at is not None else None
+        if age is not None and age <= self.ttl:
+            self.hits += 1
+            return self._value
+        if age is not None and age <= self.max_stale:
+            self.stale_hits += 1
+            self._refresh()
+            return self._value
+        
+        self.misses += 1
+        return await asyncio.shield(self._refresh())
+    
+    def _refresh(self) -> asyncio.Future:
+        # Concurrent callers share a single computation
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._run())
+            # Stale-path refreshes are never awaited; report their failures here
+            self._refreshing.add_done_callback(self._refresh_done)
+        return self._refreshing
+    
+    def _refresh_done(self, future: asyncio.Future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.refresh_errors += 1
+            print(f"❌ CACHE REFRESH ERROR - {self.name}: {error}")
+    
+    async def _run(self):
+        started_at = time.monotonic()
+        try:
+            self._value = await self._compute()
+            self._computed_at = time.monotonic()
+            self.compute_time.record(self._computed_at - started_at)
+            return self._value
+        finally:
+            self._refreshing = None
+    
+    def invalidate(self):
+        self._computed_at = None
+    
+    def set(self, value):
+        """Store a value known to be current (e.g. right after this worker changed it)"""
+        self._value = value
+        self._computed_at = time.monotonic()
+    
+    def stats(self) -> dict:
+        return {
+            "age_seconds": round(time.monotonic() - self._computed_at, 3) if self._computed_at is not None else None,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "compute_time": self.compute_time.snapshot()
+        }
+
+class SequenceAllocator:
+    """Monotonic integer sequence stored in a `counters` document.
+    
+    Each worker reserves `block_size` values with a single atomic `$inc` and
+    hands them out locally, so most calls need no database round trip.
+    Values reserved by a worker that exits are skipped, never reused.
+    """
+    def __init__(self, name: str, block_size: int, seed=None):
+        self.name = name
+        self.block_size = max(1, block_size)
+        self._seed = seed  # async callable returning the highest value already in use
+        self._seeded = False
+        self._next = 0
+        self._limit = 0  # exclusive upper bound of the reserved block
+        self._lock = asyncio.Lock()
+        self.allocated = 0
+        self.blocks_reserved = 0
+    
+    async def next_value(self) -> int:
+        async with self._lock:
+            if self._next >= self._limit:
+                await self._reserve_block()
+            value = self._next
+            self._next += 1
+            self.allocated += 1
+            return value
+    
+    async def _reserve_block(self):
+        if not self._seeded:
+            if self._seed is not None and await db.counters.find_one({"_id": self.name}) is None:
+                # $max keeps the counter correct if several workers seed at once
+                await db.counters.update_one(
+                    {"_id": self.name},
+                    {"$max": {"value": await self._seed()}},
+                    upsert=True
+                )
+            self._seeded = True
+        
+        counter = await db.counters.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._limit = counter["value"] + 1
+        self._next = self._limit - self.block_size
+        self.blocks_reserved += 1
+    
+    def stats(self) -> dict:
+        return {
+            "block_size": self.block_size,
+            "allocated": self.allocated,
+            "blocks_reserved": self.blocks_reserved,
+            "remaining_in_block": max(0, self._limit - self._next)
+        }
+
+async def _highest_employee_id() -> int:
+    last_user = await db.users.find_one({}, {"employee_id": 1}, sort=[("employee_id", -1)])
+    try:
+        return int(last_user["employee_id"]) if last_user else 0
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+employee_id_sequence = SequenceAllocator(
+    "employee_id",
+    block_size=PerformanceConfig.EMPLOYEE_ID_BLOCK_SIZE,
+    seed=_highest_employee_id
+)
+
+class CounterBuffer:
+    """Write-behind aggregator for denormalized counters (likes_count, comments_count).
+    
+    Increments are summed per (collection, document, field) in memory and
+    written with one unordered bulk_write per collection every
+    `flush_interval_ms`, or earlier once `max_pending_ops` increments are
+    waiting. Counters may lag by up to one interval; `$inc` commutes, so
+    several workers can each buffer the same document.
+    
+    Only updates the server reports as rejected (BulkWriteError writeErrors)
+    are merged back for the next flush. After an ambiguous failure (network
+    error, timeout) some updates may have been applied, so retrying could
+    count them twice: those deltas are dropped and the documents are marked
+    with counters_touched_at for CounterReconciler instead.
+    """
+    def __init__(self, flush_interval_ms: int, max_pending_ops: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending_ops = max(1, max_pending_ops)
+        self._pending = {}  # (collection, filter items) -> {field: delta}
+        self._pending_ops = 0
+        self._unmarked = {}  # collection -> filter items of dropped documents not yet marked touched
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._loop_task = None
+        self.increments = 0
+        self.documents_written = 0
+        self.bulk_writes = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.requeued_documents = 0
+        self.dropped_documents = 0
+        self.flush_latency = LatencyStats()
+    
+    def _add(self, key: tuple, field: str, delta: int):
+        deltas = self._pending.setdefault(key, {})
+        deltas[field] = deltas.get(field, 0) + delta
+        self._pending_ops += 1
+    
+    def increment(self, collection: str, target_filter: dict, field: str, delta: int = 1):
+        self._add((collection, tuple(sorted(target_filter.items()))), field, delta)
+        self.increments += 1
+        if self._pending_ops >= self.max_pending_ops and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_soon())
+    
+    async def _flush_soon(self):
+        try:
+            await self.flush()
+        finally:
+            self._flush_task = None
+    
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending and not self._unmarked:
+                return
+            pending, self._pending, self._pending_ops = self._pending, {}, 0
+            started_at = time.monotonic()
+            
+            by_collection = {}  # collection -> ([key], [UpdateOne]) in the same order
+            for key, deltas in pending.items():
+                deltas = {field: delta for field, delta in deltas.items() if delta}
+                if deltas:  # a like and an unlike in the same window cancel out
+                    keys, operations = by_collection.setdefault(key[0], ([], []))
+                    keys.append(key)
+                    operations.append(UpdateOne(
+                        dict(key[1]),
+                        # counters_touched_at tells the reconciler which documents to re-check
+                        {"$inc": deltas, "$set": {"counters_touched_at": datetime.utcnow()}}
+                    ))
+            
+            for collection, (keys, operations) in by_collection.items():
+                try:
+                    await db[collection].bulk_write(operations, ordered=False)
+                    self.documents_written += len(operations)
+                    self.bulk_writes += 1
+                except BulkWriteError as e:
+                    self.failed_flushes += 1
+                    self.bulk_writes += 1
+                    rejected = {error["index"] for error in e.details.get("writeErrors", [])}
+                    print(f"❌ COUNTER FLUSH ERROR - {collection}: {len(rejected)}/{len(operations)} updates rejected")
+                    # Every other update was applied; retrying it would count it twice
+                    for index in rejected:
+                        for field, delta in pending[keys[index]].items():
+                            self._add(keys[index], field, delta)
+                    self.requeued_documents += len(rejected)
+                    self.documents_written += len(operations) - len(rejected)
+                    if e.details.get("writeConcernErrors"):
+                        # Applied on the primary but may be rolled back
+                        self._drop(collection, [key for index, key in enumerate(keys) if index not in rejected])
+                except Exception as e:
+                    self.failed_flushes += 1
+                    print(f"❌ COUNTER FLUSH ERROR - {collection}: {e}")
+                    # Unknown how many updates were applied; leave the counts to the reconciler
+                    self._drop(collection, keys)
+            
+            await self._mark_dropped()
+            self.flushes += 1
+            self.flush_latency.record(time.monotonic() - started_at)
+    
+    def _drop(self, collection: str, keys: list):
+        self._unmarked.setdefault(collection, set()).update(key[1] for key in keys)
+        self.dropped_documents += len(keys)
+    
+    async def _mark_dropped(self):
+        # `$set` is idempotent, so marking is retried until it succeeds
+        for collection, filters in list(self._unmarked.items()):
+            try:
+                await db[collection].update_many(
+                    {"$or": [dict(filter_items) for filter_items in filters]},
+                    {"$set": {"counters_touched_at": datetime.utcnow()}}
+                )
+                del self._unmarked[collection]
+            except Exception as e:
+                print(f"❌ COUNTER MARK ERROR - {collection}: {e}")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ COUNTER FLUSH LOOP ERROR: {e}")
+    
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        await self.flush()
+    
+    def stats(self) -> dict:
+        return {
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_pending_ops": self.max_pending_ops,
+            "pending_documents": len(self._pending),
+            "pending_increments": self._pending_ops,
+            "increments": self.increments,
+            "documents_written": self.documents_written,
+            "bulk_writes": self.bulk_writes,
+            # Document updates issued per increment received; 1.0 means no coalescing
+            "write_amplification": round(self.documents_written / self.increments, 4) if self.increments else 0.0,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "requeued_documents": self.requeued_documents,
+            "dropped_documents": self.dropped_documents,
+            "unmarked_documents": sum(len(filters) for filters in self._unmarked.values()),
+            "flush_latency": self.flush_latency.snapshot()
+        }
+
+counter_buffer = CounterBuffer(
+    flush_interval_ms=PerformanceConfig.COUNTER_FLUSH_INTERVAL_MS,
+    max_pending_ops=PerformanceConfig.COUNTER_FLUSH_MAX_OPS
+)
+
+# Database indexes - applied idempotently at startup (see ensure_indexes)
+# Unique indexes mirror the places where the code assumes a single document.
+INDEX_REGISTRY = {
+    "users": [
+        {"name": "email_unique", "keys": [("email", ASCENDING)], "unique": True},
+        {"name": "employee_id_unique", "keys": [("employee_id", ASCENDING)], "unique": True},
+        {"name": "store_position", "keys": [("store", ASCENDING), ("position", ASCENDING)]},
+    ],
+    "notifications": [
+        {"name": "user_read_created", "keys": [("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)]},
+        {"name": "user_created", "keys": [("user_id", ASCENDING), ("created_at", DESCENDING)]},
+    ],
+    "likes": [
+        # One like per user and target; also serves target lookups via its prefix
+        {"name": "target_user_unique", "keys": [("target_type", ASCENDING), ("target_id", ASCENDING), ("user_id", ASCENDING)],
+         "unique": True},
+        {"name": "user", "keys": [("user_id", ASCENDING)]},
+    ],
+    "comments": [
+        {"name": "post_created", "keys": [("post_id", ASCENDING), ("created_at", ASCENDING)]},
+        {"name": "author", "keys": [("author_id", ASCENDING)]},
+    ],
+    "posts": [
+        # Keyset pagination order: (created_at, _id) descending
+        {"name": "created_id", "keys": [("created_at", DESCENDING), ("_id", DESCENDING)]},
+        {"name": "author", "keys": [("author_id", ASCENDING)]},
+        {"name": "counters_touched", "keys": [("counters_touched_at", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "announcements": [
+        {"name": "created", "keys": [("created_at", DESCENDING)]},
+        {"name": "counters_touched", "keys": [("counters_touched_at", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "files": [
+        {"name": "id_unique", "keys": [("id", ASCENDING)], "unique": True},
+        {"name": "category_created", "keys": [("category", ASCENDING), ("created_at", DESCENDING)]},
+        {"name": "counters_touched", "keys": [("counters_touched_at", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "exam_results": [
+        {"name": "employee_exam_date", "keys": [("employee_id", ASCENDING), ("exam_date", DESCENDING)]},
+    ],
+    "profiles": [
+        {"name": "user_unique", "keys": [("user_id", ASCENDING)], "unique": True},
+    ],
+    "notification_broadcasts": [
+        {"name": "seq_unique", "keys": [("seq", DESCENDING)], "unique": True},
+    ],
+    "push_subscriptions": [
+        {"name": "user_unique", "keys": [("user_id", ASCENDING)], "unique": True},
+    ],
+    "rate_limits": [
+        # Only used by the "mongo" rate limit backend
+        {"name": "expires", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "login_attempts": [
+        # Login protection with the "mongo" rate limit backend
+        {"name": "expires", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+}
+
+# Result of the last ensure_indexes run: {"collection.name": "ok" | "error: ..."}
+index_bootstrap_status = {}
+
+async def ensure_indexes():
+    """INDEX_REGISTRY'deki indexleri oluştur (mevcut olanlar için no-op)"""
+    for collection_name, specs in INDEX_REGISTRY.items():
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            status_key = f"{collection_name}.{spec['name']}"
+            try:
+                await db[collection_name].create_index(spec["keys"], **options)
+                index_bootstrap_status[status_key] = "ok"
+            except OperationFailure as e:
+                # e.g. duplicate data blocking a unique index, or a conflicting index under another name
+                index_bootstrap_status[status_key] = f"error: {e}"
+                print(f"❌ INDEX ERROR - {status_key}: {e}")
+    
+    failed = [k for k, v in index_bootstrap_status.items() if v != "ok"]
+    print(f"🗂️ INDEXES ENSURED - {len(index_bootstrap_status) - len(failed)} ok, {len(failed)} failed")
+
 # Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    hashed = await password_hasher.run(_bcrypt_hash, password.encode('utf-8'))
+    return hashed.decode('utf-8')
+
+async def verify_password(plain_password: str, hashed_password) -> bool:
+    # Older profile updates stored the hash as bytes
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    return await password_hasher.run(_bcrypt_check, plain_password.encode('utf-8'), hashed_password)
+
+def encode_cursor(created_at: datetime, doc_id) -> str:
+    """Opaque keyset cursor for a (created_at, _id) position"""
+    payload = {"t": created_at.isoformat(), "id": str(doc_id), "oid": isinstance(doc_id, ObjectId)}
+    raw = json.dumps(payload, separators=(",", ":")).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = datetime.fromisoformat(payload["t"])
+        doc_id = ObjectId(payload["id"]) if payload.get("oid") else str(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doc_id
+
+def keyset_filter(cursor: str) -> dict:
+    """Documents strictly after the cursor in (created_at desc, _id desc) order"""
+    created_at, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": doc_id}}
+    ]}
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+def clamp_page_size(limit: Optional[int]) -> int:
+    if not limit:
+        return PerformanceConfig.POSTS_PAGE_SIZE
+    return max(1, min(limit, PerformanceConfig.POSTS_PAGE_SIZE_MAX))
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -422,57 +1835,54 @@ def create_access_token(data: dict) -> str:
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await user_from_token(credentials.credentials)
+
+async def get_current_user_for_stream(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """EventSource can't send headers, so streams also accept ?token="""
+    if credentials is not None:
+        return await user_from_token(credentials.credentials)
+    if token:
+        return await user_from_token(token)
+    raise HTTPException(status_code=403, detail="Not authenticated")
+
+async def user_from_token(token: str) -> User:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await load_user_by_id(user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
+    return user
+
+async def load_user_by_id(user_id: str) -> Optional[User]:
+    """Kullanıcıyı önce cache'ten, yoksa veritabanından getir"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    if user_doc is None:
+        return None
+    
     # Convert ObjectId to string for Pydantic
-    user["_id"] = str(user["_id"])
-    return User(**user)
+    user_doc["_id"] = str(user_doc["_id"])
+    user = User(**user_doc)
+    user_cache.set(user_id, user)
+    return user
 
 async def generate_employee_id() -> str:
-    # Get the highest employee_id and increment
-    last_user = await db.users.find_one(sort=[("employee_id", -1)])
-    if last_user:
-        last_id = int(last_user["employee_id"])
-        new_id = last_id + 1
-    else:
-        new_id = 1
+    new_id = await employee_id_sequence.next_value()
     return f"{new_id:05d}"
 
-async def create_notifications_for_all_users(title: str, message: str, notification_type: str, related_id: str = None, sender_id: str = None):
-    """Tüm kullanıcılara bildirim gönder"""
-    # Tüm kullanıcıları al
-    users = await db.users.find({}, {"employee_id": 1}).to_list(1000)
-    
-    # Her kullanıcı için bildirim oluştur
-    notifications = []
-    for user in users:
-        notification_doc = {
-            "_id": str(uuid.uuid4()),
-            "user_id": user["employee_id"],
-            "title": title,
-            "message": message,
-            "type": notification_type,
-            "read": False,
-            "created_at": datetime.utcnow(),
-            "related_id": related_id,
-            "sender_id": sender_id
-        }
-        notifications.append(notification_doc)
-    
-    # Toplu olarak ekle
-    if notifications:
-        await db.notifications.insert_many(notifications)
-
 # Authentication Routes
 @api_router.post("/auth/register", response_model=Token)
 async def register(user_data: UserRegister):
@@ -489,7 +1899,7 @@ async def register(user_data: UserRegister):
     employee_id = await generate_employee_id()
     
     # Hash password
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     
     # Only admins can create admin accounts - no automatic admin
     is_admin = False
@@ -512,8 +1922,11 @@ async def register(user_data: UserRegister):
     result = await db.users.insert_one(user_doc)
     user_doc["_id"] = str(result.inserted_id)
     
+    # New employees only see broadcasts sent after they joined
+    await init_notification_read_state(employee_id)
+    
     # Create access token
-    access_token = create_access_token({"sub": str(result.inserted_id)})
+    access_token = create_access_token({"sub": str(result.inserted_id), "employee_id": employee_id})
     
     # Remove password from response
     user_doc.pop("password")
@@ -530,7 +1943,7 @@ async def login(user_credentials: UserLogin, request: Request):
         raise HTTPException(status_code=400, detail="Invalid email format")
     
     # Check if user is blocked
-    if login_protection.is_blocked(email):
+    if await login_protection.is_blocked(email):
         raise HTTPException(
             status_code=429, 
             detail="Account temporarily locked due to too many failed login attempts. Please try again later."
@@ -538,13 +1951,13 @@ async def login(user_credentials: UserLogin, request: Request):
     
     # Find user
     user = await db.users.find_one({"email": email})
-    if not user or not bcrypt.checkpw(user_credentials.password.encode('utf-8'), user['password'].encode('utf-8')):
+    if not user or not await verify_password(user_credentials.password, user['password']):
         # Record failed attempt
-        login_protection.record_failed_attempt(email)
+        await login_protection.record_failed_attempt(email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Record successful login
-    login_protection.record_success(email)
+    await login_protection.record_success(email)
     
     # Create JWT token with enhanced payload
     payload = {
@@ -603,8 +2016,7 @@ async def update_current_user_profile(user_update: dict, current_user: User = De
         update_data["store"] = user_update["store"]
     if "password" in user_update and user_update["password"]:
         # Hash new password
-        hashed_password = bcrypt.hashpw(user_update["password"].encode('utf-8'), bcrypt.gensalt())
-        update_data["password"] = hashed_password
+        update_data["password"] = await hash_password(user_update["password"])
     
     if update_data:
         result = await db.users.update_one(
@@ -614,6 +2026,8 @@ async def update_current_user_profile(user_update: dict, current_user: User = De
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
+        
+        user_cache.invalidate(current_user.id)
     
     # Return updated user
     updated_user = await db.users.find_one({"employee_id": current_user.employee_id})
@@ -659,6 +2073,7 @@ async def update_user(user_id: str, user_update: dict, current_user: User = Depe
         {"_id": ObjectId(user_id)},
         {"$set": allowed_updates}
     )
+    user_cache.invalidate(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -682,6 +2097,7 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     result = await db.users.delete_one({"_id": ObjectId(user_id)})
+    user_cache.invalidate(user_id)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -785,11 +2201,11 @@ async def create_announcement(announcement_data: AnnouncementCreate, request: Re
         sender_id=current_user.employee_id
     )
     
-    # Tüm kullanıcılara push notification da gönder
-    await send_push_notifications_to_all_users(
+    # Tüm kullanıcılara push notification da gönder (arka planda)
+    run_in_background(send_push_notifications_to_all_users(
         "🔔 Yeni Duyuru - Mikel Coffee",
         f"{title[:100]}{'...' if len(title) > 100 else ''}"
-    )
+    ))
     
     return Announcement(**announcement_doc)
 
@@ -823,6 +2239,7 @@ async def delete_announcement(announcement_id: str, current_user: User = Depends
     
     # Delete using the same query conditions
     await db.announcements.delete_one({"$or": query_conditions})
+    await db.likes.delete_many({"target_type": "announcement", "target_id": str(announcement["_id"])})
     return {"message": "Announcement deleted"}
 
 # Admin Routes for User Management
@@ -840,6 +2257,7 @@ async def assign_special_role(user_id: str, user_update: UserUpdate, current_use
         {"_id": ObjectId(user_id)},
         {"$set": {"special_role": user_update.special_role}}
     )
+    user_cache.invalidate(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -852,26 +2270,225 @@ async def assign_special_role(user_id: str, user_update: UserUpdate, current_use
     
     raise HTTPException(status_code=404, detail="User not found")
 
+STORE_SORT_FIELDS = ["store", "employee_count", "admin_count", "trainer_count", "exam_pass_rate", "total_exams"]
+
+def build_store_statistics_pipeline(search: Optional[str] = None, min_employees: int = 0) -> list:
+    """Mağaza istatistikleri - tek pipeline ile tüm mağazalar
+    
+    Users are grouped per (store, position) then per store. Exam totals come
+    from build_exam_totals_pipeline and are merged by merge_store_exam_totals,
+    so no store document ever carries its employees' exam results.
+    """
+    match = {}
+    if search:
+        match["store"] = {"$regex": re.escape(search), "$options": "i"}
+    
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"store": "$store", "position": "$position"},
+            "count": {"$sum": 1},
+            "admin_count": {"$sum": {"$cond": [{"$eq": ["$is_admin", True]}, 1, 0]}},
+            "employee_ids": {"$push": "$employee_id"}
+        }},
+        {"$group": {
+            "_id": "$_id.store",
+            "employee_count": {"$sum": "$count"},
+            "admin_count": {"$sum": "$admin_count"},
+            "trainer_count": {"$sum": {"$cond": [{"$eq": ["$_id.position", "trainer"]}, "$count", 0]}},
+            "positions": {"$push": {"k": {"$ifNull": ["$_id.position", ""]}, "v": "$count"}},
+            "employee_ids": {"$push": "$employee_ids"}
+        }},
+        {"$addFields": {"employee_ids": {"$reduce": {
+            "input": "$employee_ids", "initialValue": [], "in": {"$concatArrays": ["$$value", "$$this"]}
+        }}}},
+    ]
+    if min_employees > 0:
+        pipeline.append({"$match": {"employee_count": {"$gte": min_employees}}})
+    
+    pipeline.append({"$project": {
+        "_id": 0,
+        "store": "$_id",
+        "employee_count": 1,
+        "admin_count": 1,
+        "trainer_count": 1,
+        "position_stats": {"$arrayToObject": "$positions"},
+        "employee_ids": 1
+    }})
+    return pipeline
+
+def build_exam_totals_pipeline(employee_ids: Optional[list] = None) -> list:
+    """Sınav sayıları çalışan başına; employee_ids verilirse employee_exam_date index'i ile filtrelenir"""
+    pipeline = []
+    if employee_ids is not None:
+        pipeline.append({"$match": {"employee_id": {"$in": employee_ids}}})
+    pipeline.append({"$group": {
+        "_id": "$employee_id",
+        "total": {"$sum": 1},
+        "passed": {"$sum": {"$cond": [{"$eq": ["$passed", True]}, 1, 0]}}
+    }})
+    return pipeline
+
+def merge_store_exam_totals(stores: list, exam_totals: dict, sort_by: str = "store", descending: bool = False) -> list:
+    """Add total_exams, passed_exams and exam_pass_rate to each store and sort"""
+    for stats in stores:
+        totals = [exam_totals[employee_id] for employee_id in stats.pop("employee_ids") if employee_id in exam_totals]
+        stats["total_exams"] = sum(row["total"] for row in totals)
+        stats["passed_exams"] = sum(row["passed"] for row in totals)
+        stats["exam_pass_rate"] = stats["passed_exams"] / stats["total_exams"] if stats["total_exams"] else 0
+    
+    # Ties are broken by store name in ascending order (sort is stable)
+    stores.sort(key=lambda stats: stats["store"] or "")
+    if sort_by != "store":
+        stores.sort(key=lambda stats: stats[sort_by], reverse=descending)
+    elif descending:
+        stores.reverse()
+    return stores
+
 @api_router.get("/admin/stores")
-async def get_stores(current_user: User = Depends(get_current_user)):
+async def get_stores(
+    search: Optional[str] = None,
+    min_employees: int = 0,
+    sort_by: str = "store",
+    order: str = "asc",
+    current_user: User = Depends(get_current_user)
+):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view store data")
     
-    # Get unique stores from users
-    stores = await db.users.distinct("store")
+    if sort_by not in STORE_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field. Must be one of: {STORE_SORT_FIELDS}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Invalid order. Must be 'asc' or 'desc'")
+    
+    store_stats = await db.users.aggregate(build_store_statistics_pipeline(search, min_employees)).to_list(None)
+    
+    # Only the listed stores' employees when the list is filtered
+    employee_ids = None
+    if search or min_employees > 0:
+        employee_ids = [employee_id for stats in store_stats for employee_id in stats["employee_ids"]]
+    exam_totals = {
+        row["_id"]: row async for row in db.exam_results.aggregate(build_exam_totals_pipeline(employee_ids))
+    }
+    store_stats = merge_store_exam_totals(store_stats, exam_totals, sort_by, order == "desc")
     
-    # Get statistics for each store
-    store_stats = []
-    for store in stores:
-        employee_count = await db.users.count_documents({"store": store})
-        store_stats.append({
-            "store": store,
-            "employee_count": employee_count
-        })
+    # Positions without employees are reported as 0, like /stats
+    for stats in store_stats:
+        stats["position_stats"] = {position: stats["position_stats"].get(position, 0) for position in POSITIONS}
     
     return store_stats
 
 # Excel Export Routes
+class StreamingXlsxExport:
+    """Streams an XLSX file built from an async Mongo cursor with flat memory use.
+    
+    Rows are formatted once while the cursor is consumed, spooled to a temp
+    file and column widths are tracked as they go; the workbook is then written
+    with openpyxl's write-only mode (widths must be known before the first row)
+    and sent in chunks. `columns` is a list of (header, extractor(doc)) pairs.
+    """
+    SPOOL_BATCH = 500
+    
+    def __init__(self, sheet_title: str, columns: list, header_color: str = "8B4513", max_width: int = 50):
+        self.sheet_title = sheet_title
+        self.columns = columns
+        self.header_color = header_color
+        self.max_width = max_width
+    
+    async def stream(self, cursor):
+        spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        output = tempfile.TemporaryFile()
+        try:
+            widths = [len(header) for header, _ in self.columns]
+            batch = []
+            async for doc in cursor:
+                row = [extractor(doc) for _, extractor in self.columns]
+                for index, value in enumerate(row):
+                    length = len(str(value)) if value is not None else 0
+                    if length > widths[index]:
+                        widths[index] = length
+                batch.append(json.dumps(row, ensure_ascii=False, default=str))
+                if len(batch) >= self.SPOOL_BATCH:
+                    await asyncio.to_thread(self._spool, spool, batch)
+                    batch = []
+            if batch:
+                await asyncio.to_thread(self._spool, spool, batch)
+            
+            await asyncio.to_thread(self._write_workbook, spool, output, widths)
+            
+            while True:
+                chunk = await asyncio.to_thread(output.read, PerformanceConfig.FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
+            output.close()
+    
+    @staticmethod
+    def _spool(spool, lines: list):
+        spool.write("\n".join(lines) + "\n")
+    
+    def _write_workbook(self, spool, output, widths: list):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(self.sheet_title)
+        for index, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = min(width + 2, self.max_width)
+        
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color=self.header_color, end_color=self.header_color, fill_type="solid")
+        header_row = []
+        for header, _ in self.columns:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal="center")
+            header_row.append(cell)
+        ws.append(header_row)
+        
+        spool.seek(0)
+        for line in spool:
+            ws.append(json.loads(line))
+        
+        wb.save(output)
+        output.seek(0)
+
+def _format_start_date(user: dict) -> str:
+    start_date = user.get("start_date")
+    if not start_date:
+        return "Belirtilmemiş"
+    try:
+        # Tarih formatını düzenle
+        if isinstance(start_date, str):
+            return datetime.fromisoformat(start_date).strftime("%d.%m.%Y")
+        return start_date
+    except:
+        return start_date
+
+def _format_created_at(user: dict) -> str:
+    created_at = user.get("created_at")
+    if not created_at:
+        return "Bilinmiyor"
+    if isinstance(created_at, str):
+        try:
+            return datetime.fromisoformat(created_at.replace('Z', '+00:00')).strftime("%d.%m.%Y %H:%M")
+        except:
+            return created_at
+    return created_at.strftime("%d.%m.%Y %H:%M")
+
+USER_EXPORT = StreamingXlsxExport("Mikel Coffee Çalışanlar", [
+    ("Sicil No", lambda user: user.get("employee_id", "")),
+    ("Ad", lambda user: user.get("name", "")),
+    ("Soyad", lambda user: user.get("surname", "")),
+    ("E-posta", lambda user: user.get("email", "")),
+    ("Pozisyon", lambda user: user.get("position", "").title()),
+    ("Mağaza", lambda user: user.get("store", "Belirtilmemiş")),
+    ("İşe Giriş Tarihi", _format_start_date),
+    ("Özel Rol", lambda user: user.get("special_role", "Yok") or "Yok"),
+    ("Admin", lambda user: "Evet" if user.get("is_admin") else "Hayır"),
+    ("Kayıt Tarihi", _format_created_at),
+])
+
 @api_router.get("/admin/export/users")
 async def export_users_excel(current_user: User = Depends(get_current_user)):
     # Only admin and education department can export
@@ -879,101 +2496,14 @@ async def export_users_excel(current_user: User = Depends(get_current_user)):
         current_user.special_role != "eğitim departmanı"):
         raise HTTPException(status_code=403, detail="Only admin and education department can export data")
     
-    # Get all users
-    users = await db.users.find({}, {"password": 0}).sort("employee_id", 1).to_list(1000)
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Mikel Coffee Çalışanlar"
-    
-    # Headers
-    headers = [
-        "Sicil No", "Ad", "Soyad", "E-posta", "Pozisyon", 
-        "Mağaza", "İşe Giriş Tarihi", "Özel Rol", "Admin", "Kayıt Tarihi"
-    ]
-    
-    # Style headers
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="8B4513", end_color="8B4513", fill_type="solid")
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-    
-    # Add user data
-    for row, user in enumerate(users, 2):
-        ws.cell(row=row, column=1, value=user.get("employee_id", ""))
-        ws.cell(row=row, column=2, value=user.get("name", ""))
-        ws.cell(row=row, column=3, value=user.get("surname", ""))
-        ws.cell(row=row, column=4, value=user.get("email", ""))
-        ws.cell(row=row, column=5, value=user.get("position", "").title())
-        ws.cell(row=row, column=6, value=user.get("store", "Belirtilmemiş"))
-        
-        # İşe giriş tarihi
-        start_date = user.get("start_date")
-        if start_date:
-            try:
-                # Tarih formatını düzenle
-                if isinstance(start_date, str):
-                    date_obj = datetime.fromisoformat(start_date)
-                    formatted_start_date = date_obj.strftime("%d.%m.%Y")
-                else:
-                    formatted_start_date = start_date
-            except:
-                formatted_start_date = start_date
-        else:
-            formatted_start_date = "Belirtilmemiş"
-        ws.cell(row=row, column=7, value=formatted_start_date)
-        
-        ws.cell(row=row, column=8, value=user.get("special_role", "Yok") or "Yok")
-        ws.cell(row=row, column=9, value="Evet" if user.get("is_admin") else "Hayır")
-        
-        # Format date
-        created_at = user.get("created_at")
-        if created_at:
-            if isinstance(created_at, str):
-                try:
-                    date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    formatted_date = date_obj.strftime("%d.%m.%Y %H:%M")
-                except:
-                    formatted_date = created_at
-            else:
-                formatted_date = created_at.strftime("%d.%m.%Y %H:%M")
-        else:
-            formatted_date = "Bilinmiyor"
-        
-        ws.cell(row=row, column=10, value=formatted_date)
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to memory
-    excel_buffer = io.BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
+    # All users, streamed from the cursor (no row limit)
+    cursor = db.users.find({}, {"password": 0}).sort("employee_id", 1).batch_size(1000)
     
     # Generate filename with date
     filename = f"Mikel_Coffee_Calisanlar_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     
-    # Return as streaming response
-    def iter_excel():
-        yield excel_buffer.read()
-    
     return StreamingResponse(
-        iter_excel(),
+        USER_EXPORT.stream(cursor),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1001,6 +2531,8 @@ async def migrate_database():
             {"$set": {"is_admin": True}}
         )
     
+    user_cache.clear()
+    
 # Test endpoint to make specific user admin
 @api_router.post("/test/make-admin/{user_email}")
 async def make_user_admin(user_email: str):
@@ -1012,29 +2544,95 @@ async def make_user_admin(user_email: str):
         {"_id": user["_id"]},
         {"$set": {"is_admin": True}}
     )
+    user_cache.invalidate(user["_id"])
     
     return {"message": f"User {user_email} is now admin"}
 
-# Statistics Routes (for admin dashboard)
-@api_router.get("/stats")
-async def get_statistics(current_user: User = Depends(get_current_user)):
+# Performance metrics (for admin monitoring)
+@api_router.get("/admin/metrics")
+async def get_performance_metrics(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "password_hashing": password_hasher.stats(),
+        "user_cache": user_cache.stats(),
+        "employee_id_sequence": employee_id_sequence.stats(),
+        "push": push_dispatcher.stats(),
+        "image_derivatives": image_derivatives.stats(),
+        "dashboard_statistics_cache": dashboard_statistics.stats(),
+        "counter_buffer": counter_buffer.stats(),
+        "counter_reconciler": counter_reconciler.stats(),
+        "notification_unread": unread_counter.stats(),
+        "notification_stream": notification_broker.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "login_protection": await login_protection.stats()
+    }
+
+@api_router.get("/admin/indexes")
+async def get_index_usage(current_user: User = Depends(get_current_user)):
+    """Index kullanım raporu ($indexStats) - tanımlı, eksik ve fazla indexler"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    total_employees = await db.users.count_documents({})
+    report = []
+    for collection_name, specs in INDEX_REGISTRY.items():
+        declared = {spec["name"] for spec in specs}
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        present = {stat["name"]: stat for stat in stats}
+        
+        indexes = []
+        for name in sorted(declared | set(present)):
+            stat = present.get(name)
+            ops = stat["accesses"]["ops"] if stat else None
+            indexes.append({
+                "name": name,
+                "key": dict(stat["key"]) if stat else None,
+                "declared": name in declared or name == "_id_",
+                "present": stat is not None,
+                "ops": ops,
+                "since": stat["accesses"]["since"] if stat else None,
+                "unused": ops == 0,
+                "bootstrap_status": index_bootstrap_status.get(f"{collection_name}.{name}")
+            })
+        
+        report.append({"collection": collection_name, "indexes": indexes})
+    
+    return report
+
+# Statistics Routes (for admin dashboard)
+async def compute_dashboard_statistics() -> dict:
+    """Dashboard istatistikleri - koleksiyon başına tek aggregation"""
+    users_pipeline = [{"$facet": {
+        "total": [{"$count": "count"}],
+        "positions": [{"$group": {"_id": "$position", "count": {"$sum": 1}}}]
+    }}]
+    exams_pipeline = [{"$facet": {
+        "totals": [{"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "passed": {"$sum": {"$cond": [{"$eq": ["$passed", True]}, 1, 0]}}
+        }}]
+    }}]
+    users_result, exams_result = await asyncio.gather(
+        db.users.aggregate(users_pipeline).to_list(1),
+        db.exam_results.aggregate(exams_pipeline).to_list(1)
+    )
+    users_facet = users_result[0]
+    exams_totals = exams_result[0]["totals"]
+    
+    total_employees = users_facet["total"][0]["count"] if users_facet["total"] else 0
+    counts_by_position = {row["_id"]: row["count"] for row in users_facet["positions"]}
     
     # Count by position
-    position_stats = {}
-    for position in POSITIONS:
-        count = await db.users.count_documents({"position": position})
-        position_stats[position] = count
+    position_stats = {position: counts_by_position.get(position, 0) for position in POSITIONS}
     
     # Exam statistics
-    total_exams = await db.exam_results.count_documents({})
-    passed_exams = await db.exam_results.count_documents({"passed": True})
+    total_exams = exams_totals[0]["total"] if exams_totals else 0
+    passed_exams = exams_totals[0]["passed"] if exams_totals else 0
     
     # Management exam eligible count
-    management_eligible = await db.users.count_documents({"position": {"$in": ["barista", "supervizer"]}})
+    management_eligible = counts_by_position.get("barista", 0) + counts_by_position.get("supervizer", 0)
     
     return {
         "total_employees": total_employees,
@@ -1045,6 +2643,20 @@ async def get_statistics(current_user: User = Depends(get_current_user)):
         "management_exam_eligible": management_eligible
     }
 
+dashboard_statistics = CachedComputation(
+    "dashboard_statistics",
+    compute_dashboard_statistics,
+    ttl=PerformanceConfig.STATS_CACHE_TTL,
+    max_stale=PerformanceConfig.STATS_CACHE_MAX_STALE
+)
+
+@api_router.get("/stats")
+async def get_statistics(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await dashboard_statistics.get()
+
 # Social Media Endpoints
 
 @api_router.post("/posts", response_model=Post)
@@ -1075,14 +2687,72 @@ async def create_post(post: PostCreate, request: Request, current_user: User = D
     
     return Post(**post_data)
 
-@api_router.get("/posts", response_model=List[Post])
-async def get_posts(current_user: User = Depends(get_current_user)):
-    posts = await db.posts.find().sort("created_at", -1).to_list(length=None)
+@api_router.get("/posts", response_model=PostPage)
+async def get_posts(cursor: Optional[str] = None, limit: Optional[int] = None, current_user: User = Depends(get_current_user)):
+    """Gönderileri sayfa sayfa getir - bir sonraki sayfa için next_cursor kullanılır"""
+    limit = clamp_page_size(limit)
+    query = keyset_filter(cursor) if cursor else {}
+    
+    # Fetch one extra document to know whether another page exists
+    posts = await db.posts.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]["created_at"], posts[-1]["_id"])
+    
     # Convert ObjectId to string for each post
     for post in posts:
-        if "_id" in post:
-            post["_id"] = str(post["_id"])
-    return [Post(**post) for post in posts]
+        post["_id"] = str(post["_id"])
+    return PostPage(posts=[Post(**post) for post in posts], next_cursor=next_cursor)
+
+FEED_AUTHOR_FIELDS = ["employee_id", "name", "surname", "position", "store"]
+
+def build_feed_pipeline(query: dict, limit: int) -> list:
+    """Akış sayfası - gönderiler yazar ve profil resmi ile birlikte"""
+    return [
+        {"$match": query},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "author_id", "foreignField": "employee_id", "as": "author"}},
+        {"$lookup": {"from": "profiles", "localField": "author_id", "foreignField": "user_id", "as": "profile"}},
+        {"$addFields": {
+            "author": {"$arrayElemAt": ["$author", 0]},
+            "author_image": {"$arrayElemAt": ["$profile.profile_image_url", 0]}
+        }},
+        {"$addFields": {
+            "author": {"$cond": [
+                {"$ifNull": ["$author", False]},
+                {**{field: f"$author.{field}" for field in FEED_AUTHOR_FIELDS}, "profile_image_url": "$author_image"},
+                None
+            ]}
+        }},
+        {"$project": {"profile": 0, "author_image": 0}},
+    ]
+
+@api_router.get("/feed", response_model=FeedPage)
+async def get_feed(cursor: Optional[str] = None, limit: Optional[int] = None, current_user: User = Depends(get_current_user)):
+    """Akış - yazar bilgisi, beğeni durumu ve yorum sayısı tek yanıtta"""
+    limit = clamp_page_size(limit)
+    query = keyset_filter(cursor) if cursor else {}
+    
+    # Fetch one extra document to know whether another page exists
+    posts = await db.posts.aggregate(build_feed_pipeline(query, limit + 1)).to_list(limit + 1)
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]["created_at"], posts[-1]["_id"])
+    
+    # One query for the like state of the whole page
+    post_ids = [str(post["_id"]) for post in posts]
+    liked = await db.likes.distinct("target_id", {
+        "target_type": "post", "target_id": {"$in": post_ids}, "user_id": current_user.employee_id
+    })
+    liked = set(liked)
+    
+    for post in posts:
+        post["_id"] = str(post["_id"])
+        post["liked_by_me"] = post["_id"] in liked
+    return FeedPage(posts=[FeedPost(**post) for post in posts], next_cursor=next_cursor)
 
 @api_router.delete("/posts/{post_id}")
 async def delete_post(post_id: str, current_user: User = Depends(get_current_user)):
@@ -1098,7 +2768,7 @@ async def delete_post(post_id: str, current_user: User = Depends(get_current_use
     # Delete using the same identifier
     await db.posts.delete_one({"$or": [{"_id": post_id}, {"id": post_id}]})
     await db.comments.delete_many({"post_id": post_id})
-    await db.likes.delete_many({"post_id": post_id})
+    await db.likes.delete_many({"target_type": "post", "target_id": post_id})
     return {"message": "Post deleted"}
 
 @api_router.post("/posts/{post_id}/comments", response_model=Comment)
@@ -1127,7 +2797,7 @@ async def create_comment(post_id: str, comment: CommentCreate, request: Request,
     
     await db.comments.insert_one(comment_data)
     # Update comment count
-    await db.posts.update_one({"$or": [{"id": post_id}, {"_id": post_id}]}, {"$inc": {"comments_count": 1}})
+    counter_buffer.increment("posts", {"_id": post["_id"]}, "comments_count", 1)
     
     # Security logging
     print(f"🔐 SECURITY LOG - Comment created by: {current_user.email} on post: {post_id} from IP: {request.client.host}")
@@ -1139,63 +2809,350 @@ async def get_comments(post_id: str, current_user: User = Depends(get_current_us
     comments = await db.comments.find({"post_id": post_id}).sort("created_at", 1).to_list(length=None)
     return [Comment(**comment) for comment in comments]
 
-@api_router.post("/posts/{post_id}/like")
-async def toggle_post_like(post_id: str, current_user: User = Depends(get_current_user)):
-    # Check if post exists - use _id field
-    post = await db.posts.find_one({"_id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    existing_like = await db.likes.find_one({"post_id": post_id, "user_id": current_user.employee_id})
+# Likes
+class LikeEngine:
+    """Beğeni motoru - post, duyuru ve dosya beğenileri için ortak
+    
+    A like is one document per (target_type, target_id, user_id), kept unique
+    by an index. Toggling deletes the like if present, otherwise upserts it;
+    whichever write actually changed the collection decides the returned state
+    and the single likes_count increment (buffered through counter_buffer), so
+    concurrent toggles can't double count.
+    """
+    TARGETS = {
+        "post": {"collection": "posts", "id_field": "_id", "object_id": False,
+                 "legacy_field": "post_id", "not_found": "Post not found"},
+        "announcement": {"collection": "announcements", "id_field": "_id", "object_id": True,
+                         "legacy_field": "announcement_id", "not_found": "Announcement not found"},
+        "file": {"collection": "files", "id_field": "id", "object_id": False,
+                 "legacy_field": "file_id", "not_found": "File not found"},
+    }
     
-    if existing_like:
+    def __init__(self, database):
+        self.db = database
+    
+    def _target_filter(self, target_type: str, target_id: str) -> dict:
+        spec = self.TARGETS[target_type]
+        if spec["object_id"]:
+            if not ObjectId.is_valid(target_id):
+                raise HTTPException(status_code=404, detail=spec["not_found"])
+            return {spec["id_field"]: ObjectId(target_id)}
+        return {spec["id_field"]: target_id}
+    
+    async def toggle(self, target_type: str, target_id: str, user_id: str) -> bool:
+        """Beğeniyi aç/kapat - yeni durumu döndürür"""
+        spec = self.TARGETS[target_type]
+        target_filter = self._target_filter(target_type, target_id)
+        key = {"target_type": target_type, "target_id": target_id, "user_id": user_id}
+        
         # Unlike
-        await db.likes.delete_one({"post_id": post_id, "user_id": current_user.employee_id})
-        await db.posts.update_one({"_id": post_id}, {"$inc": {"likes_count": -1}})
-        return {"liked": False}
-    else:
+        removed = await self.db.likes.delete_one(key)
+        if removed.deleted_count:
+            counter_buffer.increment(spec["collection"], target_filter, "likes_count", -1)
+            return False
+        
         # Like
-        like_data = {
-            "_id": str(uuid.uuid4()),
-            "post_id": post_id,
-            "user_id": current_user.employee_id,
-            "created_at": datetime.utcnow()
+        if not await self.db[spec["collection"]].find_one(target_filter, {"_id": 1}):
+            raise HTTPException(status_code=404, detail=spec["not_found"])
+        try:
+            result = await self.db.likes.update_one(
+                key,
+                {"$setOnInsert": {"_id": str(uuid.uuid4()), "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+            inserted = result.upserted_id is not None
+        except DuplicateKeyError:
+            inserted = False  # a concurrent toggle inserted the same like first
+        
+        if inserted:
+            counter_buffer.increment(spec["collection"], target_filter, "likes_count", 1)
+        return True
+    
+    async def migrate_legacy_likes(self):
+        """post_id / announcement_id / file_id alanlı eski beğenileri yeni şemaya taşı"""
+        migrated = 0
+        for target_type, spec in self.TARGETS.items():
+            legacy_field = spec["legacy_field"]
+            result = await self.db.likes.update_many(
+                {legacy_field: {"$type": "string"}, "target_type": {"$exists": False}},
+                [{"$set": {"target_type": target_type, "target_id": f"${legacy_field}"}}, {"$unset": legacy_field}]
+            )
+            migrated += result.modified_count
+        if not migrated:
+            return
+        
+        # Double taps under the old toggle could leave duplicates that block the unique index
+        duplicates = self.db.likes.aggregate([
+            {"$group": {
+                "_id": {"target_type": "$target_type", "target_id": "$target_id", "user_id": "$user_id"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        removed = 0
+        async for duplicate in duplicates:
+            result = await self.db.likes.delete_many({"_id": {"$in": duplicate["ids"][1:]}})
+            removed += result.deleted_count
+        print(f"👍 LIKES MIGRATED - {migrated} likes, {removed} duplicates removed")
+
+like_engine = LikeEngine(db)
+
+async def mark_counters_touched(target_type: str, target_ids: list):
+    """Sayaçları reconciler'ın bir sonraki çalışmasında yeniden kontrol edilecek şekilde işaretle"""
+    if not target_ids:
+        return
+    spec = LikeEngine.TARGETS[target_type]
+    if spec["object_id"]:
+        target_ids = [ObjectId(target_id) for target_id in target_ids if ObjectId.is_valid(target_id)]
+    await db[spec["collection"]].update_many(
+        {spec["id_field"]: {"$in": target_ids}},
+        {"$set": {"counters_touched_at": datetime.utcnow()}}
+    )
+
+class CounterReconciler:
+    """Recomputes likes_count / comments_count from the likes and comments collections.
+    
+    Each run covers the documents whose counters_touched_at falls in
+    [previous run's end, now - settle). They are walked in
+    (counters_touched_at, _id) order in batches; after every batch the position
+    is saved in `job_checkpoints`, so an interrupted run resumes where it
+    stopped. A lease in the same document keeps concurrent workers from running
+    it twice.
+    
+    Only documents untouched for `settle` seconds are reconciled, and targets
+    with likes/comments newer than that are skipped, since other workers may
+    still buffer their increments. Corrections are conditional on the counters
+    and counters_touched_at that were read, so a flush landing in between is
+    never overwritten; one landing afterwards moves counters_touched_at into
+    the next run's window.
+    """
+    CHECKPOINT_ID = "counter_reconciler"
+    
+    def __init__(self, interval: int, batch_size: int, settle: int, lease: int):
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.settle = settle
+        self.lease = lease
+        self._loop_task = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.last_report = None
+    
+    async def _acquire_lease(self):
+        now = datetime.utcnow()
+        try:
+            return await db.job_checkpoints.find_one_and_update(
+                {"_id": self.CHECKPOINT_ID, "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]},
+                {"$set": {"lease_until": now + timedelta(seconds=self.lease)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None  # another worker holds the lease
+    
+    async def _save_checkpoint(self, fields: dict, unset: Optional[list] = None):
+        # Every save also extends the lease
+        update = {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease), **fields}}
+        if unset:
+            update["$unset"] = {field: "" for field in unset}
+        await db.job_checkpoints.update_one({"_id": self.CHECKPOINT_ID}, update)
+    
+    async def _count_by(self, collection: str, match: dict, key_field: str, recent_since: datetime):
+        """Counts per key and the keys with documents created since recent_since"""
+        rows = db[collection].aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": f"${key_field}",
+                "count": {"$sum": 1},
+                "recent": {"$max": {"$gte": ["$created_at", recent_since]}}
+            }}
+        ])
+        counts, recent = {}, set()
+        async for row in rows:
+            counts[row["_id"]] = row["count"]
+            if row["recent"]:
+                recent.add(row["_id"])
+        return counts, recent
+    
+    async def _reconcile_batch(self, target_type: str, docs: list, report: dict) -> int:
+        spec = LikeEngine.TARGETS[target_type]
+        keys = [str(doc.get(spec["id_field"])) for doc in docs]
+        recent_since = datetime.utcnow() - timedelta(seconds=self.settle)
+        expected = {}
+        expected["likes_count"], recent = await self._count_by(
+            "likes", {"target_type": target_type, "target_id": {"$in": keys}}, "target_id", recent_since
+        )
+        if target_type == "post":
+            expected["comments_count"], recent_comments = await self._count_by(
+                "comments", {"post_id": {"$in": keys}}, "post_id", recent_since
+            )
+            recent |= recent_comments
+        
+        operations = []
+        for doc, key in zip(docs, keys):
+            if key in recent:
+                report["documents_deferred"] += 1
+                continue
+            current = {field: doc.get(field) for field in expected}
+            corrected = {field: counts.get(key, 0) for field, counts in expected.items()}
+            if current == corrected:
+                continue
+            for field in expected:
+                drift_key = f"{spec['collection']}.{field}"
+                report["drift"][drift_key] = report["drift"].get(drift_key, 0) + corrected[field] - (current[field] or 0)
+            operations.append(UpdateOne(
+                {"_id": doc["_id"], "counters_touched_at": doc["counters_touched_at"], **current},
+                {"$set": corrected}
+            ))
+        
+        if operations:
+            result = await db[spec["collection"]].bulk_write(operations, ordered=False)
+            return result.modified_count
+        return 0
+    
+    async def run(self) -> Optional[dict]:
+        """Tek bir uzlaştırma çalışması - başka worker çalıştırıyorsa None döner"""
+        checkpoint = await self._acquire_lease()
+        if checkpoint is None:
+            self.skipped_runs += 1
+            return None
+        
+        started_at = time.monotonic()
+        resumed = "window_end" in checkpoint
+        if resumed:
+            window_start, window_end = checkpoint["window_start"], checkpoint["window_end"]
+        else:
+            window_start = checkpoint.get("last_window_end")
+            window_end = datetime.utcnow() - timedelta(seconds=self.settle)
+            if window_start is None:
+                # First run ever: check every document once
+                window_start = datetime(1970, 1, 1)
+                for spec in LikeEngine.TARGETS.values():
+                    await db[spec["collection"]].update_many(
+                        {"counters_touched_at": {"$exists": False}}, {"$set": {"counters_touched_at": window_start}}
+                    )
+            await self._save_checkpoint({"window_start": window_start, "window_end": window_end})
+        
+        report = {
+            "window_start": window_start,
+            "window_end": window_end,
+            "resumed": resumed,
+            "documents_checked": 0,
+            "documents_corrected": 0,
+            "documents_deferred": 0,
+            "batches": 0,
+            "drift": {}
+        }
+        target_types = list(LikeEngine.TARGETS)
+        if checkpoint.get("target_type") in target_types:
+            target_types = target_types[target_types.index(checkpoint["target_type"]):]
+        
+        for target_type in target_types:
+            spec = LikeEngine.TARGETS[target_type]
+            position = None
+            if resumed and checkpoint.get("target_type") == target_type:
+                position = (checkpoint["last_touched_at"], checkpoint["last_id"])
+            projection = {spec["id_field"]: 1, "likes_count": 1, "counters_touched_at": 1}
+            if target_type == "post":
+                projection["comments_count"] = 1
+            
+            while True:
+                query = {"counters_touched_at": {"$gte": window_start, "$lt": window_end}}
+                if position:
+                    query["$or"] = [
+                        {"counters_touched_at": {"$gt": position[0]}},
+                        {"counters_touched_at": position[0], "_id": {"$gt": position[1]}}
+                    ]
+                docs = await db[spec["collection"]].find(query, projection) \
+                    .sort([("counters_touched_at", 1), ("_id", 1)]).limit(self.batch_size).to_list(self.batch_size)
+                if not docs:
+                    break
+                
+                # Land this worker's buffered increments before comparing
+                await counter_buffer.flush()
+                report["documents_corrected"] += await self._reconcile_batch(target_type, docs, report)
+                report["documents_checked"] += len(docs)
+                report["batches"] += 1
+                position = (docs[-1]["counters_touched_at"], docs[-1]["_id"])
+                await self._save_checkpoint(
+                    {"target_type": target_type, "last_touched_at": position[0], "last_id": position[1]}
+                )
+        
+        report["elapsed_ms"] = round((time.monotonic() - started_at) * 1000, 1)
+        report["absolute_drift"] = sum(abs(value) for value in report["drift"].values())
+        # Close the window and release the lease
+        await self._save_checkpoint(
+            {"last_window_end": window_end, "last_report": report, "lease_until": datetime.utcnow()},
+            unset=["window_start", "window_end", "target_type", "last_touched_at", "last_id"]
+        )
+        
+        self.runs += 1
+        self.last_report = report
+        print(f"🧮 COUNTERS RECONCILED - {report['documents_checked']} checked, "
+              f"{report['documents_corrected']} corrected, drift {report['drift']}")
+        return report
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"❌ COUNTER RECONCILE ERROR: {e}")
+    
+    def start(self):
+        if self._loop_task is None and self.interval > 0:
+            self._loop_task = asyncio.create_task(self._run())
+    
+    def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+    
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "last_report": self.last_report
         }
-        await db.likes.insert_one(like_data)
-        await db.posts.update_one({"_id": post_id}, {"$inc": {"likes_count": 1}})
-        return {"liked": True}
+
+counter_reconciler = CounterReconciler(
+    interval=PerformanceConfig.COUNTER_RECONCILE_INTERVAL,
+    batch_size=PerformanceConfig.COUNTER_RECONCILE_BATCH_SIZE,
+    settle=PerformanceConfig.COUNTER_RECONCILE_SETTLE,
+    lease=PerformanceConfig.COUNTER_RECONCILE_LEASE
+)
+
+@api_router.post("/admin/counters/reconcile")
+async def trigger_counter_reconcile(current_user: User = Depends(get_current_user)):
+    """Sayaç uzlaştırmasını hemen başlat (arka planda)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    run_in_background(counter_reconciler.run())
+    return {"message": "Counter reconciliation started"}
+
+@api_router.get("/admin/counters/reconcile")
+async def get_counter_reconcile_status(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    checkpoint = await db.job_checkpoints.find_one({"_id": counter_reconciler.CHECKPOINT_ID}) or {}
+    return {
+        "in_progress": "window_end" in checkpoint and checkpoint.get("lease_until", datetime.min) > datetime.utcnow(),
+        "last_window_end": checkpoint.get("last_window_end"),
+        "last_report": checkpoint.get("last_report")
+    }
+
+@api_router.post("/posts/{post_id}/like")
+async def toggle_post_like(post_id: str, current_user: User = Depends(get_current_user)):
+    liked = await like_engine.toggle("post", post_id, current_user.employee_id)
+    return {"liked": liked}
 
 @api_router.post("/announcements/{announcement_id}/like")
 async def toggle_announcement_like(announcement_id: str, current_user: User = Depends(get_current_user)):
-    # Check if announcement exists - use ObjectId for MongoDB query
-    try:
-        announcement = await db.announcements.find_one({"_id": ObjectId(announcement_id)})
-    except:
-        announcement = None
-    
-    if not announcement:
-        raise HTTPException(status_code=404, detail="Announcement not found")
-    
-    existing_like = await db.likes.find_one({"announcement_id": announcement_id, "user_id": current_user.employee_id})
-    
-    if existing_like:
-        # Unlike
-        await db.likes.delete_one({"announcement_id": announcement_id, "user_id": current_user.employee_id})
-        # CRITICAL FIX: Update likes_count in announcements collection
-        await db.announcements.update_one({"_id": ObjectId(announcement_id)}, {"$inc": {"likes_count": -1}})
-        return {"liked": False}
-    else:
-        # Like
-        like_data = {
-            "id": str(uuid.uuid4()),
-            "announcement_id": announcement_id,
-            "user_id": current_user.employee_id,
-            "created_at": datetime.utcnow()
-        }
-        await db.likes.insert_one(like_data)
-        # CRITICAL FIX: Update likes_count in announcements collection
-        await db.announcements.update_one({"_id": ObjectId(announcement_id)}, {"$inc": {"likes_count": 1}})
-        return {"liked": True}
+    liked = await like_engine.toggle("announcement", announcement_id, current_user.employee_id)
+    return {"liked": liked}
 
 @api_router.get("/profile", response_model=Profile)
 async def get_profile(current_user: User = Depends(get_current_user)):
@@ -1272,11 +3229,18 @@ async def delete_user(employee_id: str, current_user: User = Depends(get_current
     
     # Delete user and related data
     await db.users.delete_one({"employee_id": employee_id})
+    user_cache.invalidate(user_to_delete["_id"])
     await db.profiles.delete_many({"user_id": employee_id})
     await db.posts.delete_many({"author_id": employee_id})
     await db.exam_results.delete_many({"employee_id": employee_id})
+    # Counters of whatever the user liked or commented on are re-checked by the reconciler
+    for target_type in LikeEngine.TARGETS:
+        liked = await db.likes.distinct("target_id", {"user_id": employee_id, "target_type": target_type})
+        await mark_counters_touched(target_type, liked)
+    await mark_counters_touched("post", await db.comments.distinct("post_id", {"author_id": employee_id}))
     await db.likes.delete_many({"user_id": employee_id})
     await db.comments.delete_many({"author_id": employee_id})
+    await db.notification_read_state.delete_one({"_id": employee_id})
     
     return {"message": f"User {employee_id} and all related data deleted successfully"}
 
@@ -1331,6 +3295,7 @@ async def update_admin_status(
         {"employee_id": employee_id},
         {"$set": {"is_admin": admin_update.is_admin}}
     )
+    user_cache.invalidate(target_user["_id"])
     
     # Security logging
     action = "granted" if admin_update.is_admin else "revoked"
@@ -1352,10 +3317,22 @@ async def update_admin_status(
 # Notification Endpoints
 @api_router.get("/notifications", response_model=List[Notification])
 async def get_user_notifications(current_user: User = Depends(get_current_user)):
-    """Kullanıcının bildirimlerini getir"""
+    """Kullanıcının bildirimlerini getir (kişisel + toplu bildirimler)"""
+    limit = PerformanceConfig.NOTIFICATION_LIST_LIMIT
     notifications = await db.notifications.find(
         {"user_id": current_user.employee_id}
-    ).sort("created_at", -1).limit(50).to_list(50)
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    
+    # Broadcasts are shown as if they were personal copies
+    state = await get_notification_read_state(current_user.employee_id)
+    broadcasts = await db.notification_broadcasts.find(
+        {"seq": {"$gt": state["base_seq"]}}
+    ).sort("seq", -1).limit(limit).to_list(limit)
+    for broadcast in broadcasts:
+        notifications.append(broadcast_as_notification(broadcast, current_user.employee_id, state))
+    
+    notifications.sort(key=lambda n: n["created_at"], reverse=True)
+    notifications = notifications[:limit]
     
     # Convert ObjectId to string and add id field for Pydantic compatibility
     for notification in notifications:
@@ -1371,21 +3348,78 @@ async def mark_notification_as_read(notification_id: str, current_user: User = D
         {"_id": notification_id, "user_id": current_user.employee_id},
         {"$set": {"read": True}}
     )
+    # modified_count is 0 when it was already read
+    await unread_counter.decrement(current_user.employee_id, result.modified_count)
     
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Notification not found")
+        broadcast = await db.notification_broadcasts.find_one({"_id": notification_id}, {"seq": 1})
+        if not broadcast:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        await mark_broadcast_as_read(current_user.employee_id, broadcast["seq"])
+    
+    # Keeps the user's other devices in sync
+    notification_broker.publish(current_user.employee_id, "read", {"id": notification_id})
     
     return {"message": "Notification marked as read"}
 
+@api_router.put("/notifications/read-all")
+async def mark_all_notifications_as_read(current_user: User = Depends(get_current_user)):
+    """Tüm bildirimleri okundu olarak işaretle"""
+    result = await db.notifications.update_many(
+        {"user_id": current_user.employee_id, "read": False},
+        {"$set": {"read": True}}
+    )
+    await unread_counter.decrement(current_user.employee_id, result.modified_count)
+    await mark_all_broadcasts_as_read(current_user.employee_id)
+    notification_broker.publish(current_user.employee_id, "read", {"all": True})
+    
+    return {"message": "All notifications marked as read", "marked": result.modified_count}
+
 @api_router.get("/notifications/unread-count")
 async def get_unread_notifications_count(current_user: User = Depends(get_current_user)):
-    """Okunmamış bildirim sayısını getir"""
-    count = await db.notifications.count_documents({
-        "user_id": current_user.employee_id,
-        "read": False
-    })
+    """Okunmamış bildirim sayısını getir - kullanıcı başına tek doküman okuması"""
+    state = await get_notification_read_state(current_user.employee_id)
+    
+    # Broadcast seqs are allocated one by one, so the unread ones are the seqs
+    # above the watermark that aren't in read_seqs (a failed insert can leave a
+    # gap, which disappears once the watermark moves past it)
+    floor = max(state["base_seq"], state["read_up_to"])
+    latest = await latest_broadcast_seq_cache.get()
+    read_above_floor = sum(1 for seq in state["read_seqs"] if floor < seq <= latest)
+    broadcast_unread = max(0, latest - floor - read_above_floor)
+    
+    return {"unread_count": state["personal_unread"] + broadcast_unread}
+
+@api_router.get("/notifications/stream")
+async def stream_notifications(request: Request, current_user: User = Depends(get_current_user_for_stream)):
+    """Canlı bildirimler (Server-Sent Events) - Last-Event-ID ile kaldığı yerden devam eder"""
+    subscription = notification_broker.subscribe(current_user.employee_id)
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
     
-    return {"unread_count": count}
+    async def event_stream():
+        try:
+            yield f"retry: {PerformanceConfig.SSE_RETRY_MS}\n\n"
+            last_seq = 0
+            for event in notification_broker.replay(last_event_id, current_user.employee_id):
+                last_seq = event.seq
+                yield event.encode()
+            
+            while not await request.is_disconnected():
+                event = await subscription.next_event(PerformanceConfig.SSE_HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event is BrokerSubscription.CLOSED:
+                    break
+                elif event.seq > last_seq:  # skip what the replay already sent
+                    yield event.encode()
+        finally:
+            notification_broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # File upload endpoint for Files section
 @api_router.post("/files/upload")
@@ -1403,13 +3437,25 @@ async def upload_file(
         raise HTTPException(status_code=403, detail="Only admins can upload files")
     
     try:
-        # File içeriğini oku
-        file_content = await file.read()
-        file_size = len(file_content)
+        # File içeriğini parça parça blob store'a yaz (tamamı belleğe alınmaz)
+        store = get_blob_store()
+        file_size = 0
+        content_hash = hashlib.sha256()
+        
+        async def upload_chunks():
+            nonlocal file_size
+            while True:
+                chunk = await file.read(PerformanceConfig.FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                content_hash.update(chunk)
+                # 100GB limit check
+                if file_size > SecurityConfig.MAX_CONTENT_LENGTH:
+                    raise HTTPException(status_code=413, detail="File size exceeds 100GB limit")
+                yield chunk
         
-        # 100GB limit check
-        if file_size > 100 * 1024 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="File size exceeds 100GB limit")
+        blob_key = await store.write_stream(upload_chunks(), file.filename)
         
         # Dosya dokümanı oluştur
         file_doc = {
@@ -1420,20 +3466,32 @@ async def upload_file(
             "filename": file.filename,
             "content_type": file.content_type,
             "size": file_size,
-            "file_content": file_content,  # Binary content
+            "sha256": content_hash.hexdigest(),  # strong ETag for view/download
+            "storage": store.name,
+            "blob_key": blob_key,
             "uploader_id": current_user.employee_id,
             "created_at": datetime.utcnow(),
             "likes_count": 0
         }
         
         # Database'e kaydet
-        result = await db.files.insert_one(file_doc)
+        try:
+            result = await db.files.insert_one(file_doc)
+        except Exception:
+            await store.delete(blob_key)
+            raise
         file_doc["_id"] = str(result.inserted_id)
         
         print(f"📁 FILE UPLOADED - {title} by {current_user.employee_id}, size: {file_size} bytes")
         
+        # Görseller için thumbnail / medium versiyonları arka planda üret
+        if (file.content_type or "").startswith("image/"):
+            run_in_background(image_derivatives.generate(file_doc["id"]))
+        
         return {"message": "File uploaded successfully", "file_id": file_doc["id"]}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ FILE UPLOAD ERROR: {e}")
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
@@ -1481,10 +3539,7 @@ async def download_file(file_id: str, request: Request, token: str = None):
             payload = jwt.decode(token_from_header, JWT_SECRET, algorithms=[JWT_ALGORITHM])
             user_id = payload.get("sub")
             if user_id:
-                user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
-                if user_doc:
-                    user_doc["_id"] = str(user_doc["_id"])
-                    current_user = User(**user_doc)
+                current_user = await load_user_by_id(user_id)
         except Exception as e:
             print(f"Header token decode error: {e}")
             pass
@@ -1509,12 +3564,24 @@ async def download_file(file_id: str, request: Request, token: str = None):
     if not current_user:
         raise HTTPException(status_code=403, detail="Authentication required")
     
-    # Dosyayı bul
-    file_doc = await db.files.find_one({"id": file_id})
+    # Dosyayı bul (içerik hariç)
+    file_doc = await db.files.find_one({"id": file_id}, {"file_content": 0})
     
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
     
+    # Client'taki kopya güncelse blob'a dokunmadan 304 dön
+    cache_headers = file_cache_headers(file_doc, "private")
+    not_modified = not_modified_response(request, cache_headers)
+    if not_modified:
+        return not_modified
+    
+    if "blob_key" not in file_doc:
+        file_doc = await load_file_for_streaming(file_id)
+        if not file_doc or "blob_key" not in file_doc:
+            raise HTTPException(status_code=404, detail="File content not found")
+        cache_headers = file_cache_headers(file_doc, "private")
+    
     try:
         # Filename'i güvenli hale getir (Turkish characters için)
         safe_filename = file_doc['filename']
@@ -1529,24 +3596,22 @@ async def download_file(file_id: str, request: Request, token: str = None):
             if not safe_filename:
                 safe_filename = "download_file"
         
-        # Binary content'i döndür
-        return Response(
-            content=file_doc["file_content"],
-            media_type=file_doc["content_type"],
-            headers={"Content-Disposition": f"attachment; filename={safe_filename}"}
-        )
+        # Binary content'i parça parça döndür (Range destekli)
+        return blob_response(request, file_doc, f"attachment; filename={safe_filename}", cache_headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ RESPONSE CREATION ERROR: {e}")
         raise HTTPException(status_code=500, detail=f"Response creation failed: {str(e)}")
 
 # Public file view endpoint for images (no download, just view)
 @api_router.get("/files/{file_id}/view")
-async def view_file(file_id: str):
+async def view_file(file_id: str, request: Request, size: Optional[str] = None):
     """Dosya görüntüleme endpoint'i - Public access for images"""
     
     try:
-        # Dosyayı veritabanından bul
-        file_doc = await db.files.find_one({"id": file_id})
+        # Dosyayı veritabanından bul (içerik hariç)
+        file_doc = await db.files.find_one({"id": file_id}, {"file_content": 0})
         
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
@@ -1556,19 +3621,34 @@ async def view_file(file_id: str):
         if not (content_type.startswith('image/') or content_type.startswith('video/')):
             raise HTTPException(status_code=403, detail="Only images and videos can be viewed publicly")
         
-        # Dosya içeriğini döndür
-        file_content = file_doc.get("file_content")
-        if not file_content:
-            raise HTTPException(status_code=404, detail="File content not found")
+        # Küçültülmüş görsel (thumb / medium) istendiyse onu sun
+        variant = None
+        if size:
+            if size not in PerformanceConfig.IMAGE_DERIVATIVE_SIZES:
+                raise HTTPException(status_code=400, detail=f"Invalid size. Use one of: {', '.join(PerformanceConfig.IMAGE_DERIVATIVE_SIZES)}")
+            if not content_type.startswith('image/'):
+                raise HTTPException(status_code=400, detail="Resized versions are only available for images")
+            variant = await image_derivatives.get_variant(file_doc, size, "image/webp" in request.headers.get("accept", ""))
+            if variant:
+                file_doc = variant
         
-        # Return file content for viewing (not download)
-        return Response(
-            content=file_content,
-            media_type=content_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{file_doc.get("title", "file")}"'
-            }
-        )
+        # Client'taki kopya güncelse blob'a dokunmadan 304 dön
+        cache_headers = file_cache_headers(file_doc, "public")
+        if variant:
+            cache_headers["Vary"] = "Accept"
+        not_modified = not_modified_response(request, cache_headers)
+        if not_modified:
+            return not_modified
+        
+        # Eski dokümanlarda içerik hâlâ file_content alanında olabilir
+        if "blob_key" not in file_doc:
+            file_doc = await load_file_for_streaming(file_id)
+            if not file_doc or "blob_key" not in file_doc:
+                raise HTTPException(status_code=404, detail="File content not found")
+            cache_headers = file_cache_headers(file_doc, "public")
+        
+        # Return file content for viewing (not download), Range destekli
+        return blob_response(request, file_doc, f'inline; filename="{file_doc.get("title", "file")}"', cache_headers)
         
     except HTTPException:
         raise
@@ -1581,31 +3661,14 @@ async def toggle_file_like(file_id: str, current_user: User = Depends(get_curren
     """Dosya beğenme"""
     
     try:
-        # Mevcut beğeniyi kontrol et
-        existing_like = await db.likes.find_one({
-            "file_id": file_id, 
-            "user_id": current_user.employee_id
-        })
-        
-        if existing_like:
-            # Unlike
-            await db.likes.delete_one({"file_id": file_id, "user_id": current_user.employee_id})
-            await db.files.update_one({"id": file_id}, {"$inc": {"likes_count": -1}})
-            return {"liked": False}
-        else:
-            # Like
-            like_data = {
-                "file_id": file_id,
-                "user_id": current_user.employee_id,
-                "created_at": datetime.utcnow()
-            }
-            await db.likes.insert_one(like_data)
-            await db.files.update_one({"id": file_id}, {"$inc": {"likes_count": 1}})
-            return {"liked": True}
-            
+        liked = await like_engine.toggle("file", file_id, current_user.employee_id)
+        return {"liked": liked}
+    
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ FILE LIKE ERROR: {e}")
-        return {"liked": False}
+        raise HTTPException(status_code=500, detail=f"File like failed: {str(e)}")
 
 @api_router.delete("/files/{file_id}")
 async def delete_file(file_id: str, current_user: User = Depends(get_current_user)):
@@ -1617,7 +3680,7 @@ async def delete_file(file_id: str, current_user: User = Depends(get_current_use
     
     try:
         # Dosyanın varlığını kontrol et
-        file_doc = await db.files.find_one({"id": file_id})
+        file_doc = await db.files.find_one({"id": file_id}, {"file_content": 0})
         
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
@@ -1629,7 +3692,14 @@ async def delete_file(file_id: str, current_user: User = Depends(get_current_use
             raise HTTPException(status_code=404, detail="File not found")
         
         # Dosya ile ilgili beğenileri de sil
-        await db.likes.delete_many({"file_id": file_id})
+        await db.likes.delete_many({"target_type": "file", "target_id": file_id})
+        
+        # Blob'u ve küçültülmüş versiyonlarını sil
+        if file_doc.get("blob_key"):
+            await get_blob_store(file_doc["storage"]).delete(file_doc["blob_key"])
+        for formats in (file_doc.get("derivatives") or {}).values():
+            for variant in formats.values():
+                await get_blob_store(variant["storage"]).delete(variant["blob_key"])
         
         print(f"📁 FILE DELETED - {file_doc['title']} by admin {current_user.employee_id}")
         
@@ -1641,6 +3711,428 @@ async def delete_file(file_id: str, current_user: User = Depends(get_current_use
         print(f"❌ DELETE FILE ERROR: {e}")
         raise HTTPException(status_code=500, detail=f"File deletion failed: {str(e)}")
 
+# File blob storage
+class BlobStore(ABC):
+    """Storage backend for file contents; blobs are written and read as chunk streams"""
+    name = None
+    
+    @abstractmethod
+    async def write_stream(self, chunks, filename: str) -> str:
+        """Consume an async iterator of bytes and return the new blob key"""
+    
+    @abstractmethod
+    async def read_stream(self, key: str, start: int = 0, length: int = None):
+        """Async iterator over `length` bytes of the blob from `start` (to the end if None)"""
+    
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+class GridFSBlobStore(BlobStore):
+    name = "gridfs"
+    
+    def __init__(self, database, bucket_name: str = "file_blobs"):
+        self._database = database
+        self._bucket_name = bucket_name
+        self._bucket = None
+    
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(
+                self._database, bucket_name=self._bucket_name,
+                chunk_size_bytes=PerformanceConfig.FILE_CHUNK_SIZE
+            )
+        return self._bucket
+    
+    async def write_stream(self, chunks, filename: str) -> str:
+        grid_in = self.bucket.open_upload_stream(filename or "file")
+        try:
+            async for chunk in chunks:
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        return str(grid_in._id)
+    
+    async def read_stream(self, key: str, start: int = 0, length: int = None):
+        grid_out = await self.bucket.open_download_stream(ObjectId(key))
+        if start:
+            # GridFS maps the offset to its chunk documents, earlier chunks are not read
+            grid_out.seek(start)
+        remaining = grid_out.length - start if length is None else length
+        while remaining > 0:
+            chunk = await grid_out.read(min(remaining, PerformanceConfig.FILE_CHUNK_SIZE))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    
+    async def delete(self, key: str):
+        try:
+            await self.bucket.delete(ObjectId(key))
+        except NoFile:
+            pass
+
+class LocalBlobStore(BlobStore):
+    name = "local"
+    
+    def __init__(self, root: Path):
+        self.root = root
+    
+    def _path(self, key: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.root / key[:2] / key
+    
+    async def write_stream(self, chunks, filename: str) -> str:
+        key = uuid.uuid4().hex
+        path = self._path(key)
+        temp_path = path.with_suffix(".part")
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        handle = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.replace, temp_path, path)
+        except BaseException:
+            handle.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+        return key
+    
+    async def read_stream(self, key: str, start: int = 0, length: int = None):
+        handle = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            if start:
+                handle.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = PerformanceConfig.FILE_CHUNK_SIZE if remaining is None else min(remaining, PerformanceConfig.FILE_CHUNK_SIZE)
+                chunk = await asyncio.to_thread(handle.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+    
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._path(key).unlink, True)
+
+blob_stores = {
+    "gridfs": GridFSBlobStore(db),
+    "local": LocalBlobStore(PerformanceConfig.FILE_STORAGE_PATH)
+}
+
+def get_blob_store(name: str = None) -> BlobStore:
+    """Yeni yüklemeler için yapılandırılmış store, mevcut dosyalar için kendi store'u"""
+    return blob_stores[name or PerformanceConfig.FILE_STORAGE_BACKEND]
+
+async def load_file_for_streaming(file_id: str) -> Optional[dict]:
+    """Dosya dokümanını içerik olmadan getir; eski dokümanları blob store'a taşı"""
+    file_doc = await db.files.find_one({"id": file_id}, {"file_content": 0})
+    if not file_doc or "blob_key" in file_doc:
+        return file_doc
+    
+    # Lazy migration: move the inline file_content into the blob store once
+    legacy = await db.files.find_one({"id": file_id, "blob_key": {"$exists": False}}, {"file_content": 1})
+    if not legacy or not legacy.get("file_content"):
+        return await db.files.find_one({"id": file_id}, {"file_content": 0})
+    
+    content = bytes(legacy["file_content"])
+    store = get_blob_store()
+    
+    async def single_chunk():
+        yield content
+    
+    blob_key = await store.write_stream(single_chunk(), file_doc.get("filename"))
+    result = await db.files.update_one(
+        {"id": file_id, "blob_key": {"$exists": False}},
+        {
+            "$set": {"storage": store.name, "blob_key": blob_key, "size": len(content), "sha256": hashlib.sha256(content).hexdigest()},
+            "$unset": {"file_content": ""}
+        }
+    )
+    if result.modified_count == 0:
+        # Another request migrated it first
+        await store.delete(blob_key)
+    else:
+        print(f"📁 FILE MIGRATED - {file_id} to {store.name} storage, size: {len(content)} bytes")
+    
+    return await db.files.find_one({"id": file_id}, {"file_content": 0})
+
+# Image derivatives (thumbnail / medium, WebP + original-format fallback)
+def _render_image_derivatives(source: bytes, sizes: dict, webp_quality: int, jpeg_quality: int):
+    # Runs inside a worker process: decode once, encode every size in two formats
+    started_at = time.time()
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(source)))
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    fallback_format, fallback_type = ("PNG", "image/png") if has_alpha else ("JPEG", "image/jpeg")
+    
+    rendered = {}
+    for size_name, max_edge in sizes.items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.LANCZOS)  # never upscales
+        
+        webp = io.BytesIO()
+        resized.save(webp, "WEBP", quality=webp_quality, method=4)
+        fallback = io.BytesIO()
+        if fallback_format == "JPEG":
+            resized.save(fallback, "JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+        else:
+            resized.save(fallback, "PNG", optimize=True)
+        
+        rendered[size_name] = {
+            "webp": (webp.getvalue(), "image/webp"),
+            "fallback": (fallback.getvalue(), fallback_type)
+        }
+    return rendered, started_at, time.time()
+
+class ImageDerivativePipeline:
+    """Görseller için küçültülmüş versiyonlar üretir (Pillow, ayrı process pool)"""
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._inflight = {}  # file_id -> Future, so concurrent first requests share one render
+        self.generated = 0
+        self.failed = 0
+        self.skipped = 0
+        self.generation_time = LatencyStats()
+        self.source_bytes = 0
+        self.derivative_bytes = 0
+        self.served = defaultdict(int)
+        self.bytes_saved_serving = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+    
+    async def generate(self, file_id: str) -> Optional[dict]:
+        future = self._inflight.get(file_id)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(file_id))
+            self._inflight[file_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(file_id, None))
+        return await asyncio.shield(future)
+    
+    async def _generate(self, file_id: str) -> Optional[dict]:
+        file_doc = await load_file_for_streaming(file_id)
+        if not file_doc or "blob_key" not in file_doc:
+            return None
+        if file_doc.get("derivatives") or file_doc.get("derivatives_failed"):
+            return file_doc.get("derivatives")
+        if file_doc["size"] > PerformanceConfig.IMAGE_DERIVATIVE_MAX_SOURCE_BYTES:
+            self.skipped += 1
+            return None
+        
+        source_store = get_blob_store(file_doc["storage"])
+        source = b"".join([chunk async for chunk in source_store.read_stream(file_doc["blob_key"])])
+        
+        loop = asyncio.get_running_loop()
+        try:
+            rendered, started_at, finished_at = await loop.run_in_executor(
+                self._get_executor(), _render_image_derivatives, source,
+                PerformanceConfig.IMAGE_DERIVATIVE_SIZES,
+                PerformanceConfig.IMAGE_WEBP_QUALITY, PerformanceConfig.IMAGE_JPEG_QUALITY
+            )
+        except BrokenProcessPool:
+            self._executor = None
+            raise
+        except Exception as e:
+            # Not a decodable image - remember it so every request doesn't retry
+            self.failed += 1
+            print(f"❌ IMAGE DERIVATIVE ERROR - {file_id}: {e}")
+            await db.files.update_one({"id": file_id}, {"$set": {"derivatives_failed": True}})
+            return None
+        
+        store = get_blob_store()
+        derivatives = {}
+        for size_name, formats in rendered.items():
+            derivatives[size_name] = {}
+            for format_name, (data, content_type) in formats.items():
+                async def single_chunk(data=data):
+                    yield data
+                blob_key = await store.write_stream(single_chunk(), f"{file_doc.get('filename')}.{size_name}.{format_name}")
+                derivatives[size_name][format_name] = {
+                    "storage": store.name,
+                    "blob_key": blob_key,
+                    "content_type": content_type,
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest()
+                }
+        
+        result = await db.files.update_one(
+            {"id": file_id, "derivatives": {"$exists": False}},
+            {"$set": {"derivatives": derivatives}}
+        )
+        if result.modified_count == 0:
+            # Another worker stored its set first (or the file was deleted)
+            for formats in derivatives.values():
+                for variant in formats.values():
+                    await store.delete(variant["blob_key"])
+            current = await db.files.find_one({"id": file_id}, {"derivatives": 1})
+            return (current or {}).get("derivatives")
+        
+        produced = sum(variant["size"] for formats in derivatives.values() for variant in formats.values())
+        self.generated += 1
+        self.generation_time.record(finished_at - started_at)
+        self.source_bytes += len(source)
+        self.derivative_bytes += produced
+        print(f"🖼️ IMAGE DERIVATIVES - {file_id}: {len(source)} bytes -> {produced} bytes in {finished_at - started_at:.3f}s")
+        return derivatives
+    
+    async def get_variant(self, file_doc: dict, size: str, accepts_webp: bool) -> Optional[dict]:
+        """File-like document for the requested variant, or None to serve the original"""
+        derivatives = file_doc.get("derivatives")
+        if derivatives is None:
+            if file_doc.get("derivatives_failed"):
+                return None
+            derivatives = await self.generate(file_doc["id"])
+            if not derivatives:
+                return None
+        
+        variant = derivatives[size]["webp" if accepts_webp else "fallback"]
+        self.served[size] += 1
+        self.bytes_saved_serving += max(0, file_doc.get("size", 0) - variant["size"])
+        return {
+            **variant,
+            "id": file_doc["id"],
+            "title": file_doc.get("title"),
+            "category": file_doc.get("category"),
+            "created_at": file_doc.get("created_at"),
+            "updated_at": file_doc.get("updated_at")
+        }
+    
+    def stats(self) -> dict:
+        return {
+            "generated": self.generated,
+            "failed": self.failed,
+            "skipped_too_large": self.skipped,
+            "generation_time": self.generation_time.snapshot(),
+            "source_bytes": self.source_bytes,
+            "derivative_bytes": self.derivative_bytes,
+            "served": dict(self.served),
+            "bytes_saved_serving": self.bytes_saved_serving
+        }
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_derivatives = ImageDerivativePipeline(workers=PerformanceConfig.IMAGE_DERIVATIVE_WORKERS)
+
+# HTTP Range support for file responses
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def parse_range_header(range_header: str, size: int):
+    """Single byte range as inclusive (start, end); None means serve the whole file.
+    
+    Multi-range requests and malformed headers are ignored (full 200 response),
+    which RFC 9110 allows; unsatisfiable ranges raise 416.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges or size == 0:
+        return None
+    
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            start, end = size - min(suffix, size), size - 1
+            satisfiable = suffix > 0
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            satisfiable = start < size
+    except ValueError:
+        return None
+    
+    if not satisfiable:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def if_range_matches(if_range: Optional[str], headers: dict) -> bool:
+    """If-Range: honour the Range only if the client's validator is still current"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Only strong ETags can validate a range
+        return "ETag" in headers and if_range == headers["ETag"]
+    return "Last-Modified" in headers and if_range == headers["Last-Modified"]
+
+def file_last_modified(file_doc: dict) -> Optional[datetime]:
+    return file_doc.get("updated_at") or file_doc.get("created_at")
+
+def file_cache_headers(file_doc: dict, visibility: str) -> dict:
+    """Validators (ETag / Last-Modified) and Cache-Control for a file, from its document only"""
+    policy = PerformanceConfig.FILE_CACHE_CONTROL.get(file_doc.get("category"), PerformanceConfig.FILE_CACHE_CONTROL_DEFAULT)
+    headers = {"Cache-Control": f"{visibility}, {policy}"}
+    if file_doc.get("sha256"):
+        headers["ETag"] = f'"{file_doc["sha256"]}"'
+    last_modified = file_last_modified(file_doc)
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def not_modified_response(request: Request, headers: dict) -> Optional[Response]:
+    """304 if the client's cached copy is still current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = headers.get("ETag")
+        if etag is None:
+            return None
+        # Weak comparison: W/"x" matches "x"
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+        return None
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is not None and parsedate_to_datetime(headers["Last-Modified"]) <= since:
+            return Response(status_code=304, headers=headers)
+    return None
+
+def blob_response(request: Request, file_doc: dict, disposition: str, cache_headers: dict):
+    """Blob'u stream et; tek aralıklı Range isteklerine 206 Partial Content ile cevap ver"""
+    size = file_doc["size"]
+    store = get_blob_store(file_doc["storage"])
+    headers = {"Accept-Ranges": "bytes", "Content-Disposition": disposition, **cache_headers}
+    
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and if_range_matches(request.headers.get("if-range"), headers):
+        byte_range = parse_range_header(range_header, size)
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(store.read_stream(file_doc["blob_key"]), media_type=file_doc["content_type"], headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        store.read_stream(file_doc["blob_key"], start, end - start + 1),
+        status_code=206,
+        media_type=file_doc["content_type"],
+        headers=headers
+    )
+
 # File edit model
 class FileEdit(BaseModel):
     title: str
@@ -1669,7 +4161,7 @@ async def edit_file(file_id: str, file_edit: FileEdit, current_user: User = Depe
             raise HTTPException(status_code=413, detail="Description too large")
         
         # Dosyanın varlığını kontrol et
-        file_doc = await db.files.find_one({"id": file_id})
+        file_doc = await db.files.find_one({"id": file_id}, {"_id": 1})
         
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
@@ -1732,77 +4224,786 @@ async def send_test_push(current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can send test notifications")
     
-    # Bu endpoint test amaçlı - gerçek push notification gönderimi için
-    # web push library'si gerekiyor (pywebpush)
-    return {"message": "Test push notification would be sent (requires pywebpush implementation)"}
+    subscription = await db.push_subscriptions.find_one(
+        {"user_id": current_user.employee_id}, PUSH_SUBSCRIPTION_PROJECTION
+    )
+    if not subscription:
+        return {"message": "Test push notification skipped: no push subscription for this user"}
+    
+    report = await deliver_push_batch([subscription], {
+        "title": "🔔 Test - Mikel Coffee",
+        "body": "Test push notification"
+    })
+    return {"message": "Test push notification sent", "report": report}
+
+# Web Push delivery
+def _b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+def _b64url_encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).decode('ascii').rstrip("=")
+
+def load_vapid_private_key(value: Optional[str]):
+    if not value:
+        return None
+    if "BEGIN" in value:
+        return serialization.load_pem_private_key(value.encode('utf-8'), password=None)
+    return ec.derive_private_key(int.from_bytes(_b64url_decode(value), "big"), ec.SECP256R1())
+
+def encrypt_push_payload(payload: bytes, p256dh: str, auth: str) -> bytes:
+    """RFC 8291 message encryption (aes128gcm content coding, single record)"""
+    ua_public = _b64url_decode(p256dh)
+    auth_secret = _b64url_decode(auth)
+    
+    as_private = ec.generate_private_key(ec.SECP256R1())
+    as_public = as_private.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    ua_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ua_public)
+    ecdh_secret = as_private.exchange(ec.ECDH(), ua_key)
+    
+    ikm = HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=auth_secret,
+        info=b"WebPush: info\x00" + ua_public + as_public
+    ).derive(ecdh_secret)
+    salt = os.urandom(16)
+    cek = HKDF(algorithm=hashes.SHA256(), length=16, salt=salt, info=b"Content-Encoding: aes128gcm\x00").derive(ikm)
+    nonce = HKDF(algorithm=hashes.SHA256(), length=12, salt=salt, info=b"Content-Encoding: nonce\x00").derive(ikm)
+    
+    # 0x02 marks the last (and only) record
+    ciphertext = AESGCM(cek).encrypt(nonce, payload + b"\x02", None)
+    record_size = 4096
+    header = salt + record_size.to_bytes(4, "big") + bytes([len(as_public)]) + as_public
+    return header + ciphertext
+
+class PushDispatcher:
+    """Sends Web Push messages concurrently over a pooled HTTP session.
+    
+    Requests run in a thread pool (requests is blocking) with at most
+    `concurrency` in flight. 429/5xx responses and network errors are retried
+    with exponential backoff; 404/410 endpoints are reported as gone so the
+    caller can prune them.
+    """
+    def __init__(self, concurrency: int, max_retries: int, backoff: float, timeout: float, ttl: int):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.ttl = ttl
+        self._vapid_key = None
+        self._vapid_public = None
+        self._vapid_tokens = {}  # audience -> (expires_at, header)
+        self._session = None
+        self._executor = None
+        self.batches = 0
+        self.sent = 0
+        self.gone = 0
+        self.failed = 0
+        self.retries = 0
+        self.skipped = 0
+        self.latency = LatencyStats()
+        self.last_batch = None
+    
+    def configure_vapid(self, private_key, subject: str):
+        self._vapid_key = private_key
+        self._vapid_subject = subject
+        self._vapid_tokens = {}
+        if private_key is not None:
+            self._vapid_public = _b64url_encode(private_key.public_key().public_bytes(
+                serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+            ))
+    
+    def _ensure_pool(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="push")
+    
+    def _vapid_header(self, endpoint: str) -> str:
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        cached = self._vapid_tokens.get(audience)
+        if cached and cached[0] - now > 3600:
+            return cached[1]
+        
+        expires_at = int(now) + 12 * 3600
+        token = jwt.encode({"aud": audience, "exp": expires_at, "sub": self._vapid_subject}, self._vapid_key, algorithm="ES256")
+        header = f"vapid t={token}, k={self._vapid_public}"
+        self._vapid_tokens[audience] = (expires_at, header)
+        return header
+    
+    async def send_many(self, subscriptions: list, payload: dict) -> dict:
+        if self._vapid_key is None:
+            self.skipped += len(subscriptions)
+            print(f"📱 PUSH SKIPPED - VAPID_PRIVATE_KEY not configured ({len(subscriptions)} subscriptions)")
+            return {"subscriptions": len(subscriptions), "sent": 0, "gone": [], "failed": 0, "skipped": len(subscriptions)}
+        
+        self._ensure_pool()
+        body = json.dumps(payload).encode('utf-8')
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batch_latency = LatencyStats()
+        
+        async def bounded(subscription):
+            async with semaphore:
+                return await self._send_one(subscription, body, batch_latency)
+        
+        started_at = time.monotonic()
+        outcomes = await asyncio.gather(*(bounded(sub) for sub in subscriptions))
+        elapsed = time.monotonic() - started_at
+        
+        gone = [sub["endpoint"] for sub, outcome in zip(subscriptions, outcomes) if outcome == "gone"]
+        sent = outcomes.count("sent")
+        failed = outcomes.count("failed")
+        self.batches += 1
+        self.sent += sent
+        self.gone += len(gone)
+        self.failed += failed
+        
+        self.last_batch = {
+            "subscriptions": len(subscriptions),
+            "sent": sent,
+            "gone": gone,
+            "failed": failed,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "throughput_per_sec": round(len(subscriptions) / elapsed, 1) if elapsed > 0 else None,
+            "latency": batch_latency.snapshot()
+        }
+        return self.last_batch
+    
+    async def _send_one(self, subscription: dict, body: bytes, batch_latency: LatencyStats) -> str:
+        loop = asyncio.get_running_loop()
+        endpoint = subscription["endpoint"]
+        try:
+            keys = subscription["keys"]
+            encrypted = await loop.run_in_executor(self._executor, encrypt_push_payload, body, keys["p256dh"], keys["auth"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"❌ PUSH INVALID SUBSCRIPTION - {endpoint}: {e}")
+            return "failed"
+        
+        headers = {
+            "Authorization": self._vapid_header(endpoint),
+            "Content-Encoding": "aes128gcm",
+            "Content-Type": "application/octet-stream",
+            "TTL": str(self.ttl)
+        }
+        post = functools.partial(self._session.post, endpoint, data=encrypted, headers=headers, timeout=self.timeout)
+        
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await loop.run_in_executor(self._executor, post)
+                status_code = response.status_code
+                if 200 <= status_code < 300:
+                    outcome = "sent"
+                elif status_code in (404, 410):
+                    outcome = "gone"
+                elif status_code == 429 or status_code >= 500:
+                    outcome = "retry"
+                    retry_after = response.headers.get("Retry-After")
+                else:
+                    outcome = "failed"
+                    print(f"❌ PUSH REJECTED - {endpoint}: HTTP {status_code}")
+            except requests.RequestException as e:
+                outcome = "retry"
+                print(f"❌ PUSH ERROR - {endpoint}: {e}")
+            
+            if outcome != "retry":
+                break
+            if attempt >= self.max_retries:
+                outcome = "failed"
+                break
+            
+            attempt += 1
+            self.retries += 1
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+            await asyncio.sleep(min(delay, PerformanceConfig.PUSH_RETRY_MAX_DELAY))
+        
+        elapsed = time.monotonic() - started_at
+        batch_latency.record(elapsed)
+        self.latency.record(elapsed)
+        return outcome
+    
+    def stats(self) -> dict:
+        return {
+            "configured": self._vapid_key is not None,
+            "concurrency": self.concurrency,
+            "batches": self.batches,
+            "sent": self.sent,
+            "gone": self.gone,
+            "failed": self.failed,
+            "retries": self.retries,
+            "skipped": self.skipped,
+            "latency": self.latency.snapshot(),
+            "last_batch": self.last_batch
+        }
+    
+    def close(self):
+        if self._session is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._session.close()
+            self._session = None
+            self._executor = None
+
+push_dispatcher = PushDispatcher(
+    concurrency=PerformanceConfig.PUSH_CONCURRENCY,
+    max_retries=PerformanceConfig.PUSH_MAX_RETRIES,
+    backoff=PerformanceConfig.PUSH_RETRY_BACKOFF,
+    timeout=PerformanceConfig.PUSH_TIMEOUT,
+    ttl=PerformanceConfig.PUSH_TTL
+)
+push_dispatcher.configure_vapid(load_vapid_private_key(VAPID_PRIVATE_KEY), VAPID_SUBJECT)
+
+PUSH_SUBSCRIPTION_PROJECTION = {"_id": 0, "user_id": 1, "endpoint": 1, "keys": 1}
+
+async def deliver_push_batch(subscriptions: list, payload: dict) -> dict:
+    """Bir grup subscription'a push gönder, geçersiz olanları (404/410) sil"""
+    report = await push_dispatcher.send_many(subscriptions, payload)
+    if report["gone"]:
+        await db.push_subscriptions.delete_many({"endpoint": {"$in": report["gone"]}})
+        print(f"📱 PUSH PRUNED {len(report['gone'])} expired subscriptions")
+    if "elapsed_ms" in report:
+        print(f"📱 PUSH BATCH - {report['sent']}/{report['subscriptions']} sent in {report['elapsed_ms']}ms ({report['throughput_per_sec']}/s)")
+    return report
 
 async def send_push_notification_to_user(user_id: str, title: str, body: str):
     """Kullanıcıya push notification gönder"""
     try:
-        # Kullanıcının push subscription'ını al
-        subscription_doc = await db.push_subscriptions.find_one({"user_id": user_id})
-        
-        if subscription_doc:
-            # Gerçek implementasyon için pywebpush library'si gerekiyor
-            # Şimdilik console'a log yazdıralım
-            print(f"📱 PUSH NOTIFICATION - User: {user_id}, Title: {title}, Body: {body}")
-            print(f"📱 PUSH SUBSCRIPTION: {subscription_doc['endpoint']}")
-            
-            # TODO: Implement actual push notification sending with pywebpush
-            # from pywebpush import webpush, WebPushException
-            # webpush(subscription_info=subscription_doc, data=json.dumps({
-            #     "title": title,
-            #     "body": body
-            # }), vapid_private_key="path/to/private_key.pem", vapid_claims={"sub": "mailto:admin@mikelcoffee.com"})
-            
+        subscription = await db.push_subscriptions.find_one({"user_id": user_id}, PUSH_SUBSCRIPTION_PROJECTION)
+        if subscription:
+            await deliver_push_batch([subscription], {"title": title, "body": body})
         else:
             print(f"📱 NO PUSH SUBSCRIPTION found for user: {user_id}")
-            
     except Exception as e:
         print(f"❌ Error sending push notification: {e}")
 
 async def send_push_notifications_to_all_users(title: str, body: str):
     """Tüm kullanıcılara push notification gönder"""
     try:
-        # Tüm push subscription'ları al
-        subscriptions = await db.push_subscriptions.find({}).to_list(1000)
-        
-        print(f"📱 SENDING PUSH TO {len(subscriptions)} USERS: {title}")
-        
-        for subscription in subscriptions:
-            await send_push_notification_to_user(subscription["user_id"], title, body)
-            
+        payload = {"title": title, "body": body}
+        batch_size = PerformanceConfig.PUSH_BATCH_SIZE
+        batch = []
+        cursor = db.push_subscriptions.find({}, PUSH_SUBSCRIPTION_PROJECTION).batch_size(batch_size)
+        async for subscription in cursor:
+            batch.append(subscription)
+            if len(batch) >= batch_size:
+                await deliver_push_batch(batch, payload)
+                batch = []
+        if batch:
+            await deliver_push_batch(batch, payload)
     except Exception as e:
         print(f"❌ Error sending push notifications to all users: {e}")
 
+# Background jobs
+_background_tasks = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Coroutine'i request'ten bağımsız çalıştır (referansı tutulur, GC'ye gitmez)"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+class FanoutJob:
+    """Progress of one notification fan-out"""
+    def __init__(self, title: str, notification_type: str):
+        self.id = str(uuid.uuid4())
+        self.title = title
+        self.type = notification_type
+        self.status = "queued"  # queued, running, completed, failed
+        self.total_users = None
+        self.processed = 0
+        self.inserted = 0
+        self.chunks = 0
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+    
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "type": self.type,
+            "status": self.status,
+            "total_users": self.total_users,
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+fanout_jobs = OrderedDict()  # job_id -> FanoutJob, most recent last
+
 async def create_notifications_for_all_users(title: str, message: str, notification_type: str, related_id: str = None, sender_id: str = None):
-    """Tüm kullanıcılara bildirim oluştur"""
+    """Tüm kullanıcılara bildirim oluştur (tek broadcast dokümanı veya arka planda fan-out)"""
+    if PerformanceConfig.NOTIFICATION_DELIVERY == "broadcast":
+        return await create_broadcast_notification(title, message, notification_type, related_id, sender_id)
+    
+    job = FanoutJob(title, notification_type)
+    fanout_jobs[job.id] = job
+    while len(fanout_jobs) > PerformanceConfig.NOTIFICATION_JOB_HISTORY:
+        fanout_jobs.popitem(last=False)
+    
+    run_in_background(_fan_out_notifications(job, {
+        "title": title,
+        "message": message,
+        "type": notification_type,
+        "read": False,
+        "created_at": datetime.utcnow(),
+        "related_id": related_id,
+        "sender_id": sender_id
+    }))
+    return job
+
+async def _fan_out_notifications(job: FanoutJob, template: dict):
+    chunk_size = PerformanceConfig.NOTIFICATION_FANOUT_CHUNK_SIZE
+    job.status = "running"
     try:
-        # Tüm kullanıcıları al
-        users = await db.users.find({}).to_list(1000)
-        
-        # Her kullanıcı için bildirim oluştur
-        notifications = []
-        for user in users:
-            notification = {
-                "user_id": user["employee_id"],
-                "title": title,
-                "message": message,
-                "type": notification_type,
-                "read": False,
-                "created_at": datetime.utcnow(),
-                "related_id": related_id,
-                "sender_id": sender_id
-            }
-            notifications.append(notification)
+        job.total_users = await db.users.estimated_document_count()
         
-        # Bulk insert for performance
-        if notifications:
-            await db.notifications.insert_many(notifications)
-            print(f"📧 Created {len(notifications)} notifications for all users")
-            
+        chunk = []
+        cursor = db.users.find({}, {"employee_id": 1, "_id": 0}).batch_size(chunk_size)
+        async for user in cursor:
+            # String _id so /notifications/{id}/read can match it directly
+            chunk.append({"_id": str(uuid.uuid4()), "user_id": user["employee_id"], **template})
+            if len(chunk) >= chunk_size:
+                await _insert_notification_chunk(job, chunk)
+                chunk = []
+        if chunk:
+            await _insert_notification_chunk(job, chunk)
+        
+        job.status = "completed"
+        print(f"📧 Created {job.inserted} notifications for all users ({job.chunks} chunks)")
     except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
         print(f"❌ Error creating notifications for all users: {e}")
+    finally:
+        job.finished_at = datetime.utcnow()
+
+async def _insert_notification_chunk(job: FanoutJob, chunk: list):
+    inserted = chunk
+    try:
+        await db.notifications.insert_many(chunk, ordered=False)
+    except BulkWriteError as e:
+        # ordered=False: the rest of the chunk is still written
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        inserted = [notification for i, notification in enumerate(chunk) if i not in failed]
+        print(f"❌ NOTIFICATION CHUNK ERROR - {len(failed)} failed")
+    await unread_counter.increment_many([notification["user_id"] for notification in inserted])
+    for notification in inserted:
+        notification_broker.publish(notification["user_id"], "notification", notification_event_payload(notification))
+    job.inserted += len(inserted)
+    job.processed += len(chunk)
+    job.chunks += 1
+
+# Broadcast notifications: one document per broadcast, read state per user.
+# notification_read_state: {_id: employee_id, base_seq, read_up_to, read_seqs}
+#   base_seq   - broadcasts up to this seq predate the user and are hidden
+#   read_up_to - every broadcast up to this seq has been read
+#   read_seqs  - broadcasts read above the watermark (kept small by compaction)
+broadcast_sequence = SequenceAllocator("notification_broadcast", block_size=1)
+
+async def create_broadcast_notification(title: str, message: str, notification_type: str, related_id: str = None, sender_id: str = None) -> dict:
+    broadcast = {
+        "_id": str(uuid.uuid4()),
+        "seq": await broadcast_sequence.next_value(),
+        "title": title,
+        "message": message,
+        "type": notification_type,
+        "created_at": datetime.utcnow(),
+        "related_id": related_id,
+        "sender_id": sender_id
+    }
+    await db.notification_broadcasts.insert_one(broadcast)
+    latest_broadcast_seq_cache.set(broadcast["seq"])
+    notification_broker.publish(None, "notification", notification_event_payload(broadcast))
+    print(f"📧 Created broadcast notification #{broadcast['seq']}: {title}")
+    return broadcast
+
+async def latest_broadcast_seq() -> int:
+    latest = await db.notification_broadcasts.find_one({}, {"seq": 1}, sort=[("seq", -1)])
+    return latest["seq"] if latest else 0
+
+latest_broadcast_seq_cache = CachedComputation(
+    "latest_broadcast_seq",
+    latest_broadcast_seq,
+    ttl=PerformanceConfig.BROADCAST_SEQ_CACHE_TTL,
+    max_stale=PerformanceConfig.BROADCAST_SEQ_CACHE_TTL * 12
+)
+
+async def init_notification_read_state(employee_id: str):
+    latest = await latest_broadcast_seq()
+    await db.notification_read_state.update_one(
+        {"_id": employee_id},
+        {"$set": {"base_seq": latest, "read_up_to": latest, "read_seqs": [], "personal_unread": 0}},
+        upsert=True
+    )
+
+async def get_notification_read_state(employee_id: str) -> dict:
+    state = await db.notification_read_state.find_one({"_id": employee_id})
+    # Users created before broadcasts existed see every broadcast
+    return {
+        "base_seq": (state or {}).get("base_seq", 0),
+        "read_up_to": (state or {}).get("read_up_to", 0),
+        "read_seqs": (state or {}).get("read_seqs", []),
+        "personal_unread": max(0, (state or {}).get("personal_unread", 0))
+    }
+
+def broadcast_as_notification(broadcast: dict, employee_id: str, state: dict) -> dict:
+    seq = broadcast["seq"]
+    return {
+        "_id": broadcast["_id"],
+        "user_id": employee_id,
+        "title": broadcast["title"],
+        "message": broadcast["message"],
+        "type": broadcast["type"],
+        "read": seq <= state["read_up_to"] or seq in state["read_seqs"],
+        "created_at": broadcast["created_at"],
+        "related_id": broadcast.get("related_id")
+    }
+
+async def mark_broadcast_as_read(employee_id: str, seq: int):
+    state = await db.notification_read_state.find_one_and_update(
+        {"_id": employee_id},
+        {"$addToSet": {"read_seqs": seq}, "$setOnInsert": {"base_seq": 0, "read_up_to": 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    
+    # Compact: advance the watermark to just below the oldest unread broadcast
+    old_watermark = state["read_up_to"]
+    floor = max(state["base_seq"], old_watermark)
+    first_unread = await db.notification_broadcasts.find_one(
+        {"seq": {"$gt": floor, "$nin": state["read_seqs"]}}, {"seq": 1}, sort=[("seq", 1)]
+    )
+    if first_unread:
+        new_watermark = first_unread["seq"] - 1
+    else:
+        new_watermark = max([floor] + state["read_seqs"])
+    
+    if new_watermark > old_watermark:
+        await db.notification_read_state.update_one(
+            {"_id": employee_id, "read_up_to": old_watermark},
+            {"$set": {"read_up_to": new_watermark}, "$pull": {"read_seqs": {"$lte": new_watermark}}}
+        )
+
+async def mark_all_broadcasts_as_read(employee_id: str):
+    latest = await latest_broadcast_seq()
+    await db.notification_read_state.update_one(
+        {"_id": employee_id},
+        {"$max": {"read_up_to": latest}, "$pull": {"read_seqs": {"$lte": latest}}, "$setOnInsert": {"base_seq": 0}},
+        upsert=True
+    )
+
+class NotificationUnreadCounter:
+    """Per-user count of unread personal notifications (notification_read_state.personal_unread).
+    
+    Incremented when fan-out inserts notifications and decremented when they are
+    read, so /notifications/unread-count is a single-key read. A periodic recount
+    rebuilds the counters from the notifications collection in batches: it
+    covers every user with unread notifications (creating missing read state)
+    and every counter that is still non-zero. Each correction is conditional
+    on the value read before counting, so it never overwrites a concurrent
+    increment.
+    """
+    def __init__(self, recount_interval: int, batch_size: int):
+        self.recount_interval = recount_interval
+        self.batch_size = batch_size
+        self._loop_task = None
+        self.recounts = 0
+        self.corrections = 0
+        self.last_recount_at = None
+        self.recount_time = LatencyStats()
+    
+    async def increment_many(self, user_ids: list):
+        if not user_ids:
+            return
+        # Users from before read state existed get a document on their first notification
+        await db.notification_read_state.bulk_write([
+            UpdateOne({"_id": user_id}, {"$inc": {"personal_unread": 1}, "$setOnInsert": {"base_seq": 0, "read_up_to": 0}}, upsert=True)
+            for user_id in user_ids
+        ], ordered=False)
+    
+    async def decrement(self, user_id: str, count: int = 1):
+        if count:
+            await db.notification_read_state.update_one({"_id": user_id}, {"$inc": {"personal_unread": -count}})
+    
+    async def recount(self) -> int:
+        """Tüm kullanıcıların sayaçlarını notifications koleksiyonundan yeniden hesapla"""
+        started_at = time.monotonic()
+        corrected = 0
+        seen = set()
+        
+        # Users with unread notifications, including those without read state yet
+        rows = db.notifications.aggregate([
+            {"$match": {"read": False}},
+            {"$group": {"_id": "$user_id"}}
+        ], batchSize=self.batch_size)
+        batch = []
+        async for row in rows:
+            seen.add(row["_id"])
+            batch.append(row["_id"])
+            if len(batch) >= self.batch_size:
+                corrected += await self._recount_batch(batch)
+                batch = []
+        if batch:
+            corrected += await self._recount_batch(batch)
+        
+        # Counters left over for users who have nothing unread any more
+        cursor = db.notification_read_state.find(
+            {"personal_unread": {"$exists": True, "$ne": 0}}, {"_id": 1}
+        ).batch_size(self.batch_size)
+        batch = []
+        async for state in cursor:
+            if state["_id"] in seen:
+                continue
+            batch.append(state["_id"])
+            if len(batch) >= self.batch_size:
+                corrected += await self._recount_batch(batch)
+                batch = []
+        if batch:
+            corrected += await self._recount_batch(batch)
+        
+        self.recounts += 1
+        self.corrections += corrected
+        self.last_recount_at = datetime.utcnow()
+        self.recount_time.record(time.monotonic() - started_at)
+        if corrected:
+            print(f"🔔 UNREAD COUNTERS RECOUNTED - {corrected} corrected")
+        return corrected
+    
+    async def _recount_batch(self, user_ids: list) -> int:
+        # Read the counters before counting; a later increment then fails the conditional update
+        states = {
+            state["_id"]: state.get("personal_unread")
+            async for state in db.notification_read_state.find({"_id": {"$in": user_ids}}, {"personal_unread": 1})
+        }
+        rows = db.notifications.aggregate([
+            {"$match": {"user_id": {"$in": user_ids}, "read": False}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ])
+        actual = {row["_id"]: row["count"] async for row in rows}
+        
+        operations = []
+        for user_id in user_ids:
+            count = actual.get(user_id, 0)
+            if user_id in states:
+                if states[user_id] != count:
+                    operations.append(UpdateOne({"_id": user_id, "personal_unread": states[user_id]},
+                                                {"$set": {"personal_unread": count}}))
+            elif count:
+                # No read state yet; if increment_many creates it meanwhile the insert is rejected
+                operations.append(UpdateOne(
+                    {"_id": user_id, "personal_unread": {"$exists": False}},
+                    {"$set": {"personal_unread": count}, "$setOnInsert": {"base_seq": 0, "read_up_to": 0}},
+                    upsert=True
+                ))
+        if not operations:
+            return 0
+        try:
+            result = await db.notification_read_state.bulk_write(operations, ordered=False)
+            return result.modified_count + result.upserted_count
+        except BulkWriteError as e:
+            # Duplicate keys from the race above; the next recount picks those users up
+            return e.details.get("nModified", 0) + e.details.get("nUpserted", 0)
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.recount()
+            except Exception as e:
+                print(f"❌ UNREAD RECOUNT ERROR: {e}")
+            await asyncio.sleep(self.recount_interval)
+    
+    def start(self):
+        if self._loop_task is None and self.recount_interval > 0:
+            self._loop_task = asyncio.create_task(self._run())
+    
+    def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+    
+    def stats(self) -> dict:
+        return {
+            "recount_interval_seconds": self.recount_interval,
+            "recounts": self.recounts,
+            "corrections": self.corrections,
+            "last_recount_at": self.last_recount_at,
+            "recount_time": self.recount_time.snapshot()
+        }
+
+unread_counter = NotificationUnreadCounter(
+    recount_interval=PerformanceConfig.NOTIFICATION_UNREAD_RECOUNT_INTERVAL,
+    batch_size=PerformanceConfig.NOTIFICATION_UNREAD_RECOUNT_BATCH_SIZE
+)
+
+# Live notification stream
+class BrokerEvent:
+    __slots__ = ("seq", "id", "event", "user_id", "data")
+    
+    def __init__(self, seq: int, event_id: str, event: str, user_id: Optional[str], data: str):
+        self.seq = seq
+        self.id = event_id
+        self.event = event
+        self.user_id = user_id  # None for events every user receives
+        self.data = data
+    
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {self.data}\n\n"
+
+class BrokerSubscription:
+    """One SSE connection: a small bounded queue of undelivered events"""
+    CLOSED = object()
+    
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+    
+    async def next_event(self, timeout: float):
+        """Next event, or None when nothing arrived within `timeout` (time for a heartbeat)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class NotificationBroker:
+    """In-process pub/sub for live notifications.
+    
+    Events get a per-process sequence and are kept in a bounded replay buffer
+    for Last-Event-ID resume; ids carry a boot id, so ids from another worker or
+    an earlier process (or older than the buffer) get a `resync` event telling
+    the client to refetch /notifications instead. A connection that falls
+    `queue_size` events behind is emptied and sent `resync` too, which bounds
+    memory per connection. Only connections on the worker that produced an
+    event receive it live.
+    """
+    def __init__(self, queue_size: int, replay_size: int):
+        self.queue_size = queue_size
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._replay = deque(maxlen=replay_size)
+        self._subscriptions = {}  # user_id -> set of BrokerSubscription
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.resyncs = 0
+    
+    def subscribe(self, user_id: str) -> BrokerSubscription:
+        subscription = BrokerSubscription(user_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: BrokerSubscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+    
+    def _resync_event(self) -> BrokerEvent:
+        self.resyncs += 1
+        return BrokerEvent(self._seq, f"{self.boot_id}-{self._seq}", "resync", None, "{}")
+    
+    def publish(self, user_id: Optional[str], event: str, payload: dict):
+        """user_id=None sends the event to everyone"""
+        self._seq += 1
+        message = BrokerEvent(self._seq, f"{self.boot_id}-{self._seq}", event, user_id,
+                              json.dumps(payload, default=str, separators=(",", ":")))
+        self._replay.append(message)
+        self.published += 1
+        
+        if user_id is None:
+            targets = [s for subscriptions in self._subscriptions.values() for s in subscriptions]
+        else:
+            targets = self._subscriptions.get(user_id, ())
+        for subscription in targets:
+            self._deliver(subscription, message)
+    
+    def _deliver(self, subscription: BrokerSubscription, message: BrokerEvent):
+        try:
+            subscription.queue.put_nowait(message)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            # Too far behind: drop what it hasn't read and let the client refetch
+            self.overflows += 1
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(self._resync_event())
+    
+    def replay(self, last_event_id: Optional[str], user_id: str) -> list:
+        """Events after `last_event_id` for this user"""
+        if not last_event_id:
+            return []
+        boot_id, _, seq = last_event_id.partition("-")
+        oldest = self._replay[0].seq if self._replay else self._seq + 1
+        if boot_id != self.boot_id or not seq.isdigit() or int(seq) < oldest - 1:
+            return [self._resync_event()]
+        return [event for event in self._replay
+                if event.seq > int(seq) and event.user_id in (None, user_id)]
+    
+    def close(self):
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(BrokerSubscription.CLOSED)
+    
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "users_connected": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+            "resyncs": self.resyncs,
+            "replay_buffer": len(self._replay)
+        }
+
+notification_broker = NotificationBroker(
+    queue_size=PerformanceConfig.SSE_QUEUE_SIZE,
+    replay_size=PerformanceConfig.SSE_REPLAY_BUFFER
+)
+
+def notification_event_payload(notification: dict) -> dict:
+    return {
+        "id": str(notification["_id"]),
+        "title": notification["title"],
+        "message": notification["message"],
+        "type": notification["type"],
+        "read": False,
+        "created_at": notification["created_at"].isoformat(),
+        "related_id": notification.get("related_id")
+    }
+
+@api_router.get("/admin/notification-jobs")
+async def get_notification_jobs(current_user: User = Depends(get_current_user)):
+    """Bu worker'daki son bildirim fan-out işlerinin durumu"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return [job.to_dict() for job in reversed(fanout_jobs.values())]
+
+@api_router.get("/admin/notification-jobs/{job_id}")
+async def get_notification_job(job_id: str, current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = fanout_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -1822,6 +5023,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_database():
+    rate_limiter.backend.start()
+    login_protection.backend.start()
+    counter_buffer.start()
+    counter_reconciler.start()
+    unread_counter.start()
+    try:
+        # Must run before the likes unique index is built
+        await like_engine.migrate_legacy_likes()
+        await ensure_indexes()
+    except Exception as e:
+        # Don't keep the API down because Mongo was briefly unreachable
+        print(f"❌ INDEX BOOTSTRAP ERROR: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Give running fan-out jobs a chance to finish before the client closes
+    if _background_tasks:
+        await asyncio.wait(set(_background_tasks), timeout=PerformanceConfig.BACKGROUND_SHUTDOWN_GRACE)
+    counter_reconciler.stop()
+    unread_counter.stop()
+    notification_broker.close()
+    await counter_buffer.stop()
+    password_hasher.shutdown()
+    image_derivatives.shutdown()
+    push_dispatcher.close()
+    rate_limiter.backend.close()
+    login_protection.backend.close()
     client.close()
\ No newline at end of file
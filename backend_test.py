@@ -7,6 +7,7 @@ Tests all API endpoints, authentication, role-based permissions, and business lo
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 
 # Configuration
@@ -510,14 +511,14 @@ class BackendTester:
         # Use the specific admin token for social media tests
         admin_token = self.tokens.get("social_admin") or self.tokens.get("specific_admin") or self.tokens.get("admin")
         
-        # Test 1: GET /api/posts (should return empty array initially)
+        # Test 1: GET /api/posts (paginated: {"posts": [...], "next_cursor": ...})
         response = self.make_request("GET", "/posts", token=admin_token)
         if response["success"]:
-            posts = response["data"]
-            if isinstance(posts, list):
-                self.log_test("GET posts endpoint", True, f"Posts endpoint returned array with {len(posts)} posts")
+            page = response["data"]
+            if isinstance(page, dict) and isinstance(page.get("posts"), list) and "next_cursor" in page:
+                self.log_test("GET posts endpoint", True, f"Posts endpoint returned page with {len(page['posts'])} posts")
             else:
-                self.log_test("GET posts endpoint", False, f"Expected array, got: {type(posts)}")
+                self.log_test("GET posts endpoint", False, f"Expected posts page, got: {type(page)}")
         else:
             self.log_test("GET posts endpoint", False, "Failed to get posts", response["data"])
         
@@ -550,7 +551,31 @@ class BackendTester:
                     self.log_test("POST like post", False, f"Like response missing 'liked' field: {like_result}")
             else:
                 self.log_test("POST like post", False, "Failed to like post", response["data"])
-        
+
+        # Test 3b: GET /api/feed (posts with author, liked_by_me and counts)
+        response = self.make_request("GET", "/feed", token=admin_token)
+        if response["success"]:
+            feed = response["data"]
+            feed_post = next((p for p in feed.get("posts", []) if p.get("_id") == post_id), None)
+            if feed_post and feed_post.get("author") and "liked_by_me" in feed_post and "comments_count" in feed_post:
+                self.log_test("GET feed", True, f"Feed post has author {feed_post['author']['name']}, liked_by_me={feed_post['liked_by_me']}")
+            else:
+                self.log_test("GET feed", False, f"Created post missing or incomplete in feed: {feed_post}")
+        else:
+            self.log_test("GET feed", False, "Failed to get feed", response["data"])
+
+        # Test 3c: concurrent double tap must leave likes_count consistent with liked_by_me
+        if post_id:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                list(pool.map(lambda _: self.make_request("POST", f"/posts/{post_id}/like", token=admin_token), range(2)))
+            time.sleep(1.5)  # counters are written behind (COUNTER_FLUSH_INTERVAL_MS)
+            response = self.make_request("GET", "/feed", token=admin_token)
+            feed_post = next((p for p in response["data"].get("posts", []) if p.get("_id") == post_id), None) if response["success"] else None
+            if feed_post and feed_post["likes_count"] == (1 if feed_post["liked_by_me"] else 0):
+                self.log_test("Concurrent like toggles", True, f"likes_count={feed_post['likes_count']}, liked_by_me={feed_post['liked_by_me']}")
+            else:
+                self.log_test("Concurrent like toggles", False, f"Like count drifted: {feed_post}")
+
         # Test 4: GET /api/profile (test profile endpoint)
         response = self.make_request("GET", "/profile", token=admin_token)
         if response["success"]:
@@ -1332,7 +1357,19 @@ class BackendTester:
                         self.log_test("STEP 8b: Unread count after read", False, "Failed to get unread count after marking as read")
                 else:
                     self.log_test("STEP 8a: Mark notification as read", False, "Failed to mark notification as read", response["data"])
-        
+
+        # Step 8c: Bulk mark-all-read clears personal and broadcast notifications
+        response = self.make_request("PUT", "/notifications/read-all", token=test_users[1]["token"])
+        if response["success"]:
+            response = self.make_request("GET", "/notifications/unread-count", token=test_users[1]["token"])
+            unread = response["data"].get("unread_count") if response["success"] else None
+            if unread == 0:
+                self.log_test("STEP 8c: Mark all as read", True, "Unread count is 0 after read-all")
+            else:
+                self.log_test("STEP 8c: Mark all as read", False, f"Unread count should be 0 after read-all, got: {unread}")
+        else:
+            self.log_test("STEP 8c: Mark all as read", False, "Failed to mark all notifications as read", response["data"])
+
         # Step 9: Test notification access control (user can only access their own notifications)
         if notification_id:
             # Try to mark another user's notification as read
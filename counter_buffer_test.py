@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Counter Buffer Testing
+Runs the write-behind counter buffer against an in-process collection that fails on demand (no Mongo needed)
+"""
+
+import sys
+import os
+import asyncio
+from typing import Any
+
+from pymongo.errors import BulkWriteError, AutoReconnect
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import server  # noqa: E402
+
+
+class FlakyCollection:
+    """Applies `$inc` updates like Mongo; rejects or half-applies batches when told to"""
+    def __init__(self):
+        self.docs = {}
+        self.reject_ids = set()
+        self.disconnect_after = None  # apply this many updates, then lose the connection
+        self.marked = []
+
+    def _apply(self, operation):
+        doc = self.docs.setdefault(operation._filter["_id"], {})
+        for field, delta in operation._doc["$inc"].items():
+            doc[field] = doc.get(field, 0) + delta
+
+    async def bulk_write(self, operations, ordered=True):
+        errors = []
+        for index, operation in enumerate(operations):
+            if self.disconnect_after is not None and index == self.disconnect_after:
+                self.disconnect_after = None
+                raise AutoReconnect("connection closed")
+            if operation._filter["_id"] in self.reject_ids:
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+                continue
+            self._apply(operation)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nModified": len(operations) - len(errors)})
+
+    async def update_many(self, query, update):
+        self.marked.extend(condition["_id"] for condition in query["$or"])
+
+
+class CounterBufferTester:
+    def __init__(self):
+        self.test_results = []
+        self.collection = FlakyCollection()
+        server.db = {"posts": self.collection}
+
+    def log_test(self, test_name: str, success: bool, message: str, details: Any = None):
+        """Log test results"""
+        self.test_results.append({"test": test_name, "success": success, "message": message, "details": details})
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status}: {test_name} - {message}")
+        if details and not success:
+            print(f"   Details: {details}")
+
+    def likes(self, post_id: str) -> int:
+        return self.collection.docs.get(post_id, {}).get("likes_count", 0)
+
+    async def test_partial_failure(self):
+        buffer = server.CounterBuffer(flush_interval_ms=1000, max_pending_ops=10 ** 6)
+        for post_id in ("p1", "p2", "p3"):
+            buffer.increment("posts", {"_id": post_id}, "likes_count", 1)
+        self.collection.reject_ids = {"p2"}
+        await buffer.flush()
+        self.collection.reject_ids = set()
+        await buffer.flush()
+
+        counts = {post_id: self.likes(post_id) for post_id in ("p1", "p2", "p3")}
+        self.log_test("Partial failure not double counted", counts == {"p1": 1, "p2": 1, "p3": 1},
+                      f"counts={counts}", buffer.stats())
+        self.log_test("Only rejected update requeued", buffer.stats()["requeued_documents"] == 1,
+                      f"requeued={buffer.stats()['requeued_documents']}")
+
+    async def test_ambiguous_failure(self):
+        buffer = server.CounterBuffer(flush_interval_ms=1000, max_pending_ops=10 ** 6)
+        for post_id in ("q1", "q2", "q3"):
+            buffer.increment("posts", {"_id": post_id}, "likes_count", 1)
+        self.collection.disconnect_after = 1
+        await buffer.flush()
+        await buffer.flush()
+
+        counts = {post_id: self.likes(post_id) for post_id in ("q1", "q2", "q3")}
+        self.log_test("Ambiguous failure not retried", counts == {"q1": 1, "q2": 0, "q3": 0}, f"counts={counts}")
+        self.log_test("Dropped documents marked for the reconciler",
+                      sorted(self.collection.marked) == ["q1", "q2", "q3"] and buffer.stats()["unmarked_documents"] == 0,
+                      f"marked={sorted(self.collection.marked)}")
+
+    def run_all_tests(self):
+        print("🚀 Starting Counter Buffer Tests")
+        asyncio.run(self.test_partial_failure())
+        asyncio.run(self.test_ambiguous_failure())
+
+        failed = [r for r in self.test_results if not r["success"]]
+        print(f"\n📊 {len(self.test_results) - len(failed)}/{len(self.test_results)} tests passed")
+        return not failed
+
+
+if __name__ == "__main__":
+    tester = CounterBufferTester()
+    sys.exit(0 if tester.run_all_tests() else 1)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Login Protection Testing
+Runs LoginProtection on the memory and shared-memory backends with a controllable clock (no server needed)
+"""
+
+import sys
+import os
+import time
+import asyncio
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import server  # noqa: E402
+
+MAX_ATTEMPTS = server.SecurityConfig.LOGIN_MAX_ATTEMPTS
+LOCKOUT_TIME = server.SecurityConfig.LOGIN_LOCKOUT_TIME
+
+
+class Clock:
+    """Replaces time.time so the tests can step over window boundaries"""
+    def __init__(self):
+        # 1s before a lockout window boundary, the worst case for a sliding window
+        self.now = (int(time.time() // LOCKOUT_TIME) + 1) * LOCKOUT_TIME - 1
+        self._real = time.time
+
+    def __enter__(self):
+        time.time = lambda: self.now
+        return self
+
+    def __exit__(self, *args):
+        time.time = self._real
+
+
+class UnreachableCollection:
+    def aggregate(self, *args, **kwargs):
+        raise server.OperationFailure("connection refused")
+
+
+class LoginProtectionTester:
+    def __init__(self):
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, message: str, details: Any = None):
+        """Log test results"""
+        self.test_results.append({"test": test_name, "success": success, "message": message, "details": details})
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status}: {test_name} - {message}")
+        if details and not success:
+            print(f"   Details: {details}")
+
+    async def lockout_holds(self, name: str, backend: server.RateLimitBackend):
+        protection = server.LoginProtection(backend, MAX_ATTEMPTS, LOCKOUT_TIME)
+        email = f"{name}@mikelcoffee.com"
+        with Clock() as clock:
+            for _ in range(MAX_ATTEMPTS - 1):
+                await protection.record_failed_attempt(email)
+            self.log_test(f"{name}: not blocked below the limit", not await protection.is_blocked(email),
+                          f"{MAX_ATTEMPTS - 1} failures")
+
+            await protection.record_failed_attempt(email)
+            blocked_at = clock.now
+            held = []
+            for offset in (0, 61, LOCKOUT_TIME / 2, LOCKOUT_TIME - 1):
+                clock.now = blocked_at + offset
+                held.append(await protection.is_blocked(email))
+            self.log_test(f"{name}: block holds for the full lockout time", all(held),
+                          f"blocked at +0/61/{LOCKOUT_TIME // 2}/{LOCKOUT_TIME - 1}s: {held}")
+
+            clock.now = blocked_at + LOCKOUT_TIME + 1
+            lifted = not await protection.is_blocked(email)
+            await protection.record_failed_attempt(email)
+            self.log_test(f"{name}: attempts start over after the lockout",
+                          lifted and not await protection.is_blocked(email), f"lifted={lifted}")
+
+            stats = await protection.stats()
+            self.log_test(f"{name}: identities counted", stats["tracked_identities"] == 1 and stats["blocked_identities"] == 0,
+                          f"tracked={stats['tracked_identities']} blocked={stats['blocked_identities']}", stats)
+
+    async def lockout_survives_flood(self, name: str, backend: server.RateLimitBackend, capacity: int):
+        """Random-email failures beyond the table's capacity must not evict a live lockout"""
+        protection = server.LoginProtection(backend, MAX_ATTEMPTS, LOCKOUT_TIME)
+        victim = f"victim-{name}@mikelcoffee.com"
+        with Clock():
+            for _ in range(MAX_ATTEMPTS):
+                await protection.record_failed_attempt(victim)
+            for i in range(capacity * 4):
+                await protection.record_failed_attempt(f"random-{i}@{name}.test")
+            self.log_test(f"{name}: lockout survives a full table", await protection.is_blocked(victim),
+                          f"{capacity * 4} random emails into {capacity} entries", backend.stats())
+
+            # Once only live blocks are left, new keys are turned away instead
+            for i in range(capacity):
+                for _ in range(MAX_ATTEMPTS):
+                    await protection.record_failed_attempt(f"blocked-{i}@{name}.test")
+            stats = backend.stats()
+            self.log_test(f"{name}: new keys rejected when only blocks are left",
+                          await protection.is_blocked(victim) and stats["rejected"] > 0,
+                          f"rejected={stats['rejected']}", stats)
+
+    async def test_mongo_outage(self):
+        server.db = {"login_attempts": UnreachableCollection()}
+        backend = server.MongoRateLimitBackend("login_attempts")
+        usage = await backend.usage()
+        self.log_test("mongo: usage survives an outage", usage == {"tracked": 0, "blocked": 0} and backend.errors == 1,
+                      f"usage={usage} errors={backend.errors}")
+
+    def run_all_tests(self):
+        print("🚀 Starting Login Protection Tests")
+        asyncio.run(self.lockout_holds("memory", server.MemoryRateLimitBackend(max_keys=1000, sweep_interval=60)))
+        asyncio.run(self.lockout_survives_flood("memory", server.MemoryRateLimitBackend(max_keys=20, sweep_interval=60), 20))
+
+        shared = server.SharedMemoryRateLimitBackend(f"login_protection_test_{os.getpid()}", slots=64, lock_stripes=4)
+        try:
+            asyncio.run(self.lockout_holds("shared", shared))
+        finally:
+            # The backend hands the segment over from the resource tracker; take it back to unlink it
+            server.resource_tracker.register(shared._shm._name, "shared_memory")
+            shared._shm.unlink()
+            shared.close()
+
+        # A single region, so every key competes for the victim's probe slots
+        region = server.SharedMemoryRateLimitBackend(f"login_protection_region_{os.getpid()}", slots=8, lock_stripes=1)
+        try:
+            asyncio.run(self.lockout_survives_flood("shared region", region, region.PROBE))
+        finally:
+            server.resource_tracker.register(region._shm._name, "shared_memory")
+            region._shm.unlink()
+            region.close()
+
+        asyncio.run(self.test_mongo_outage())
+
+        failed = [r for r in self.test_results if not r["success"]]
+        print(f"\n📊 {len(self.test_results) - len(failed)}/{len(self.test_results)} tests passed")
+        return not failed
+
+
+if __name__ == "__main__":
+    tester = LoginProtectionTester()
+    sys.exit(0 if tester.run_all_tests() else 1)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Push Dispatcher Testing
+Runs the Web Push dispatcher against a local stub push service (no network needed)
+"""
+
+import sys
+import os
+import json
+import time
+import base64
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import jwt
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import server  # noqa: E402
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+class StubSubscriber:
+    """Browser side of a push subscription: owns the keys and can decrypt messages"""
+    def __init__(self):
+        self.private_key = ec.generate_private_key(ec.SECP256R1())
+        self.public_bytes = self.private_key.public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        )
+        self.auth_secret = os.urandom(16)
+
+    def keys(self) -> dict:
+        return {"p256dh": b64url(self.public_bytes), "auth": b64url(self.auth_secret)}
+
+    def decrypt(self, body: bytes) -> bytes:
+        salt, key_len = body[:16], body[20]
+        as_public = body[21:21 + key_len]
+        ciphertext = body[21 + key_len:]
+        as_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), as_public)
+        ecdh_secret = self.private_key.exchange(ec.ECDH(), as_key)
+        ikm = HKDF(algorithm=hashes.SHA256(), length=32, salt=self.auth_secret,
+                   info=b"WebPush: info\x00" + self.public_bytes + as_public).derive(ecdh_secret)
+        cek = HKDF(algorithm=hashes.SHA256(), length=16, salt=salt, info=b"Content-Encoding: aes128gcm\x00").derive(ikm)
+        nonce = HKDF(algorithm=hashes.SHA256(), length=12, salt=salt, info=b"Content-Encoding: nonce\x00").derive(ikm)
+        plaintext = AESGCM(cek).decrypt(nonce, ciphertext, None)
+        return plaintext.rstrip(b"\x00")[:-1]  # drop the 0x02 last-record delimiter
+
+
+class StubPushService:
+    """Local HTTP server answering like a push service, keyed by request path"""
+    def __init__(self, vapid_public_key):
+        self.received = []
+        self.attempts = {}
+        self.subscribers = {}
+        self.vapid_public_key = vapid_public_key
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                service.attempts[self.path] = service.attempts.get(self.path, 0) + 1
+                status = service.respond(self.path, self.headers, body)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def respond(self, path: str, headers, body: bytes) -> int:
+        if path.startswith("/gone"):
+            return 410
+        if path.startswith("/notfound"):
+            return 404
+        if path.startswith("/bad"):
+            return 400
+        if path.startswith("/flaky") and self.attempts[path] == 1:
+            return 503
+
+        # Validate the VAPID token and decrypt the payload like a real push service/browser would
+        token = headers["Authorization"].split("t=")[1].split(",")[0]
+        jwt.decode(token, self.vapid_public_key, algorithms=["ES256"], audience=self.base_url)
+        assert headers["Content-Encoding"] == "aes128gcm"
+        self.received.append(json.loads(self.subscribers[path].decrypt(body)))
+        time.sleep(0.05)  # simulated push service latency
+        return 201
+
+    def subscription(self, path: str) -> dict:
+        subscriber = StubSubscriber()
+        self.subscribers[path] = subscriber
+        return {"user_id": path.strip("/"), "endpoint": f"{self.base_url}{path}", "keys": subscriber.keys()}
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class PushDispatcherTester:
+    def __init__(self):
+        self.test_results = []
+        vapid_key = ec.generate_private_key(ec.SECP256R1())
+        self.dispatcher = server.PushDispatcher(concurrency=16, max_retries=2, backoff=0.01, timeout=5, ttl=60)
+        self.dispatcher.configure_vapid(vapid_key, "mailto:test@mikelcoffee.com")
+        self.stub = StubPushService(vapid_key.public_key())
+
+    def log_test(self, test_name: str, success: bool, message: str, details: Any = None):
+        """Log test results"""
+        self.test_results.append({"test": test_name, "success": success, "message": message, "details": details})
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status}: {test_name} - {message}")
+        if details and not success:
+            print(f"   Details: {details}")
+
+    def test_outcomes(self):
+        subscriptions = [
+            self.stub.subscription("/ok-1"),
+            self.stub.subscription("/flaky-1"),
+            self.stub.subscription("/gone-1"),
+            self.stub.subscription("/notfound-1"),
+            self.stub.subscription("/bad-1"),
+        ]
+        report = asyncio.run(self.dispatcher.send_many(subscriptions, {"title": "Duyuru", "body": "Merhaba"}))
+
+        self.log_test("Delivered and retried", report["sent"] == 2, f"sent={report['sent']}", report)
+        self.log_test("Flaky endpoint retried", self.stub.attempts.get("/flaky-1") == 2,
+                      f"attempts={self.stub.attempts.get('/flaky-1')}")
+        expected_gone = {f"{self.stub.base_url}/gone-1", f"{self.stub.base_url}/notfound-1"}
+        self.log_test("404/410 reported for pruning", set(report["gone"]) == expected_gone, f"gone={report['gone']}")
+        self.log_test("Other 4xx not retried", report["failed"] == 1 and self.stub.attempts.get("/bad-1") == 1,
+                      f"failed={report['failed']}")
+        self.log_test("Payload decrypted by subscriber",
+                      {"title": "Duyuru", "body": "Merhaba"} in self.stub.received, f"received={self.stub.received}")
+
+    def test_concurrency(self):
+        subscriptions = [self.stub.subscription(f"/ok-batch-{i}") for i in range(64)]
+        report = asyncio.run(self.dispatcher.send_many(subscriptions, {"title": "Toplu", "body": "Test"}))
+        # 64 requests x 50ms serially would take 3.2s; 16 in parallel should take ~0.2s
+        self.log_test("Concurrent delivery", report["sent"] == 64 and report["elapsed_ms"] < 1600,
+                      f"{report['sent']} sent in {report['elapsed_ms']}ms ({report['throughput_per_sec']}/s)", report)
+
+    def run_all_tests(self):
+        print("🚀 Starting Push Dispatcher Tests")
+        try:
+            self.test_outcomes()
+            self.test_concurrency()
+        finally:
+            self.stub.close()
+            self.dispatcher.close()
+
+        failed = [r for r in self.test_results if not r["success"]]
+        print(f"\n📊 {len(self.test_results) - len(failed)}/{len(self.test_results)} tests passed")
+        return not failed
+
+
+if __name__ == "__main__":
+    tester = PushDispatcherTester()
+    sys.exit(0 if tester.run_all_tests() else 1)